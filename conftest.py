@@ -0,0 +1,10 @@
+import pytest
+
+
+@pytest.fixture(autouse=True, scope='session')
+def isolated_environment(django_test_environment):
+    # Тот же кэш и те же снимки на прогон, что у manage.py test:
+    # pytest-django TEST_RUNNER из настроек не использует
+    from core.test_runner import isolated_environment
+    with isolated_environment():
+        yield
@@ -0,0 +1,258 @@
+# core/cache.py
+"""Кэширование страниц с инвалидацией через счётчики поколений.
+
+Каждая область данных (общая лента, группа, профиль, пост) имеет
+счётчик поколения в кэше. Запись в модель увеличивает счётчик, а ключ
+закэшированной страницы включает текущие поколения её областей, поэтому
+после изменения старая копия просто перестаёт находиться и страницы
+можно хранить часами.
+
+Тело страницы общее для всех зрителей: персональные фрагменты (шапка,
+кнопка подписки, форма комментария) кэшируются метками и дорисовываются
+при отдаче (core/holes.py).
+
+Те же поколения служат валидатором для условных GET: ETag страницы
+меняется вместе с ключом кэша, и повторный запрос с If-None-Match
+получает 304 без рендеринга и без запросов к базе.
+
+Перестройку устаревшей записи ведёт один запрос (single-flight): он
+берёт блокировку через cache.add, а остальные в окне CACHE_STALE_GRACE
+получают прежнюю копию, вместо того чтобы разом рендерить одно и то же.
+"""
+import hashlib
+import time
+from functools import wraps
+from urllib.parse import quote
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.cache import (get_conditional_response,
+                                patch_cache_control, patch_vary_headers)
+from django.utils.http import quote_etag
+
+from . import db_routers, holes, metrics
+
+GENERATION_PREFIX = 'gen'
+
+
+def generation_key(scope, *parts):
+    # quote(): слаги и имена могут быть не-ASCII, а ключ должен быть
+    # пригоден для любого бэкенда кэша
+    return ':'.join(quote(str(part))
+                    for part in (GENERATION_PREFIX, scope) + parts)
+
+
+def _initial_generation():
+    # Старт от текущего времени: если счётчик вытеснят из кэша, новое
+    # значение не совпадёт ни с одним из прежних поколений
+    return int(time.time() * 1000)
+
+
+def get_generations(keys):
+    """Текущие поколения для ключей; отсутствующие заводит заново."""
+    generations = cache.get_many(keys)
+    missing = {key: _initial_generation()
+               for key in keys if key not in generations}
+    if missing:
+        for key, value in missing.items():
+            cache.add(key, value, None)
+        generations.update(cache.get_many(list(missing)))
+    return [generations[key] for key in keys]
+
+
+def acquire(key):
+    """Блокировка перестройки key; True — перестраивает этот запрос.
+
+    Истекает сама через CACHE_LOCK_TIMEOUT, если запрос упал.
+    """
+    return cache.add(f'lock:{key}', 1, s.CACHE_LOCK_TIMEOUT)
+
+
+def release(key):
+    cache.delete(f'lock:{key}')
+
+
+def wait_for(key, ready):
+    """Ждёт до CACHE_LOCK_WAIT, пока другой запрос перестроит key.
+
+    Возвращает значение, для которого ready(value) истинно, или None.
+    """
+    deadline = time.monotonic() + s.CACHE_LOCK_WAIT
+    while time.monotonic() < deadline:
+        time.sleep(0.02)
+        value = cache.get(key)
+        if value is not None and ready(value):
+            return value
+    return None
+
+
+def envelope(value, timeout):
+    """Запись для кэша со сроком свежести timeout.
+
+    Класть её нужно на stale_timeout(timeout): после срока свежести
+    запись ещё можно отдать устаревшей.
+    """
+    return time.time() + timeout, value
+
+
+def stale_timeout(timeout):
+    return timeout + s.CACHE_STALE_GRACE
+
+
+def is_fresh(entry):
+    return entry[0] > time.time()
+
+
+def _increment(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.add(key, _initial_generation(), None)
+
+
+def bump(*keys):
+    """Переводит области на новое поколение.
+
+    Внутри транзакции — ещё раз после коммита: до него другой процесс
+    видит новое поколение, но прежние строки, и закэшировал бы под
+    новым ключом устаревшую страницу.
+    """
+    _increment(keys)
+    if transaction.get_connection().in_atomic_block:
+        transaction.on_commit(lambda: _increment(keys))
+
+
+def viewer_key(request):
+    """Кто смотрит страницу: аноним или конкретная сессия пользователя.
+
+    От зрителя зависят только фрагменты-дырки, поэтому он входит в
+    ETag, но не в ключ кэша.
+    """
+    if not request.user.is_authenticated:
+        return 'anon'
+    # CSRF-cookie меняется при входе, а страницы содержат CSRF-токен
+    csrf = request.COOKIES.get(s.CSRF_COOKIE_NAME, '')
+    return f'{request.user.pk}.{csrf}'
+
+
+def page_cache_key(request, generations):
+    """Ключ страницы: адрес и поколения.
+
+    В кэше под ключом адреса (page_slot_key) лежит последняя отрисовка
+    страницы с её ключом: совпадает ключ — копия свежая, нет — по ней
+    ещё можно ответить, пока страницу перестраивает другой запрос.
+    """
+    versions = '.'.join(str(generation) for generation in generations)
+    return f'{page_slot_key(request)}:{versions}'
+
+
+def page_slot_key(request):
+    path = hashlib.md5(request.get_full_path().encode()).hexdigest()
+    return f'page:{path}'
+
+
+def page_etag(key, request):
+    """ETag страницы: хэш её ключа в кэше (адреса и поколений) и
+    зрителя — у анонима и у каждого пользователя свои дырки."""
+    raw = f'{key}:{viewer_key(request)}'
+    return quote_etag(hashlib.md5(raw.encode()).hexdigest())
+
+
+def _render_page(request, view, args, kwargs, slot, key, timeout):
+    """Отрисовывает страницу; возвращает её и признак того, что она
+    легла в кэш под slot."""
+    # Персональные фрагменты — метками, общими для всех
+    request.punch_holes = True
+    try:
+        response = view(request, *args, **kwargs)
+    finally:
+        request.punch_holes = False
+    # Страницу с отстающей реплики не кэшируем: иначе она пережила бы
+    # запись, уже сменившую поколение
+    if (response.status_code != 200 or response.cookies
+            or db_routers.reading_stale_replica()):
+        return response, False
+    cache.set(slot, envelope((key, response), timeout),
+              stale_timeout(timeout))
+    return response, True
+
+
+def _single_flight(request, slot, current, build):
+    """Страница из слота кэша или от build(), которую ведёт один запрос.
+
+    Возвращает (ответ, закэширован ли, ключ, с которым он отрисован);
+    ключ отличается от текущего, когда отдаётся устаревшая копия.
+    """
+    entry = cache.get(slot)
+    if entry is not None and current(entry):
+        metrics.count_cache(1, 0)
+        return entry[1][1], True, None
+    if acquire(slot):
+        metrics.count_cache(0, 1)
+        try:
+            return build() + (None,)
+        finally:
+            release(slot)
+    if entry is not None and not db_routers.pinned(request):
+        # Страницу перестраивает другой запрос — отдаём прежнюю копию.
+        # Тому, кто только что писал, она не годится
+        metrics.count_cache(1, 0)
+        stale_key, response = entry[1]
+        return response, True, stale_key
+    entry = wait_for(slot, current)
+    metrics.count_cache(entry is not None, entry is None)
+    if entry is not None:
+        return entry[1][1], True, None
+    # Перестраивающий запрос не успел: рендерим сами
+    return build() + (None,)
+
+
+def cache_page_by_generations(scopes, timeout=None):
+    """Аналог cache_page, инвалидируемый поколениями областей.
+
+    scopes(request, *args, **kwargs) возвращает ключи поколений
+    (см. generation_key), от которых зависит страница.
+    """
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                return view(request, *args, **kwargs)
+            keys = scopes(request, *args, **kwargs)
+            generations = get_generations(keys)
+            key = page_cache_key(request, generations)
+            etag = page_etag(key, request)
+            not_modified = get_conditional_response(request, etag=etag)
+            if not_modified is not None:
+                patch_vary_headers(not_modified, ('Cookie',))
+                return not_modified
+            slot = page_slot_key(request)
+
+            def current(entry):
+                return entry[1][0] == key and is_fresh(entry)
+
+            def build():
+                return _render_page(request, view, args, kwargs, slot,
+                                    key, timeout or s.PAGE_CACHE_TIMEOUT)
+
+            response, cached, stale_key = _single_flight(
+                request, slot, current, build)
+            if not cached:
+                return holes.fill(request, response)
+            if stale_key is None:
+                response['ETag'] = etag
+                # С каких поколений отрисована страница: по ним
+                # сверяются статические снимки (core/snapshots.py)
+                response.generations = dict(zip(keys, generations))
+            else:
+                response['ETag'] = page_etag(stale_key, request)
+            # Клиент хранит страницу, но сверяет её при каждом показе;
+            # страницы пользователей — только у него
+            patch_cache_control(response, no_cache=True,
+                                private=request.user.is_authenticated)
+            patch_vary_headers(response, ('Cookie',))
+            return holes.fill(request, response)
+        return wrapper
+    return decorator
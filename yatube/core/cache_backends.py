@@ -0,0 +1,293 @@
+# core/cache_backends.py
+"""Кэш в файле SQLite, общий для всех процессов на одной машине.
+
+Замена LocMemCache без внешних сервисов: каждый воркер gunicorn видит
+одни и те же записи, поэтому попадания не делятся между воркерами, а
+инвалидация доходит до всех. Вытеснение — LRU по времени последнего
+чтения, с ограничением числа записей (MAX_ENTRIES) и объёма (MAX_SIZE).
+
+Значения хранятся в pickle: кто может писать в файл, тот выполняет код
+в процессе сайта. Поэтому файл лежит в каталоге, доступном только
+владельцу процесса, а чужой или открытый для записи каталог бэкенд
+использовать отказывается.
+
+    CACHES = {
+        'default': {
+            'BACKEND': 'core.cache_backends.SQLiteCache',
+            'LOCATION': '/var/lib/yatube/cache.sqlite3',
+            'OPTIONS': {'MAX_ENTRIES': 100000, 'MAX_SIZE': 512 * 2 ** 20},
+        }
+    }
+"""
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.exceptions import ImproperlyConfigured
+
+SCHEMA = [
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL, '
+    'accessed REAL NOT NULL, size INTEGER NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_accessed ON cache (accessed)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)',
+]
+# Время последнего чтения обновляем не чаще раза в секунду на запись:
+# для LRU этого хватает, а лишних записей в файл меньше
+ACCESS_RESOLUTION = 1.0
+
+
+def _check_private(path, info):
+    if info.st_uid != os.getuid() or info.st_mode & 0o022:
+        raise ImproperlyConfigured(
+            f'{path}: файл кэша и его каталог должны принадлежать '
+            'владельцу процесса и быть закрыты для записи другим')
+
+
+class SQLiteCache(BaseCache):
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._path = location
+        self._max_size = int(options.get('MAX_SIZE', 0))
+        self._cull_interval = int(options.get('CULL_CHECK_INTERVAL', 100))
+        self._busy_timeout = float(options.get('BUSY_TIMEOUT', 5.0))
+        self._local = threading.local()
+        self._writes = 0
+        self._prepared = False
+
+    def _prepare(self):
+        """Создаёт каталог (0700) и файл (0600) кэша; отказывается от
+        каталога или файла, которые может переписать кто-то другой.
+
+        Журнал WAL SQLite создаёт с правами самого файла.
+        """
+        directory = os.path.dirname(os.path.abspath(self._path))
+        os.makedirs(directory, mode=0o700, exist_ok=True)
+        _check_private(directory, os.stat(directory))
+        descriptor = os.open(self._path, os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            _check_private(self._path, os.fstat(descriptor))
+            os.fchmod(descriptor, 0o600)
+        finally:
+            os.close(descriptor)
+        self._prepared = True
+
+    # Соединение своё у каждого потока и у каждого процесса после fork
+    def _connection(self):
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            if not self._prepared:
+                self._prepare()
+            connection = sqlite3.connect(
+                self._path, timeout=self._busy_timeout,
+                isolation_level=None, check_same_thread=False)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')
+            for sql in SCHEMA:
+                connection.execute(sql)
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+    def _transaction(self):
+        return _Immediate(self._connection())
+
+    def _key(self, key, version):
+        key = self.make_key(key, version=version)
+        self.validate_key(key)
+        return key
+
+    @staticmethod
+    def _dumps(value):
+        return pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+
+    def _fetch(self, connection, keys):
+        now = time.time()
+        found, expired, stale = {}, [], []
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            rows = connection.execute(
+                'SELECT key, value, expires, accessed FROM cache '
+                'WHERE key IN (%s)' % ','.join('?' * len(chunk)), chunk)
+            for key, value, expires, accessed in rows:
+                if expires is not None and expires <= now:
+                    expired.append(key)
+                    continue
+                found[key] = value
+                if accessed < now - ACCESS_RESOLUTION:
+                    stale.append(key)
+        if expired or stale:
+            with self._transaction() as connection:
+                self._delete_keys(connection, expired)
+                connection.executemany(
+                    'UPDATE cache SET accessed = ? WHERE key = ?',
+                    [(now, key) for key in stale])
+        return found
+
+    @staticmethod
+    def _delete_keys(connection, keys):
+        connection.executemany('DELETE FROM cache WHERE key = ?',
+                               [(key,) for key in keys])
+
+    def _write(self, connection, key, value, timeout, replace=True):
+        blob = self._dumps(value)
+        verb = 'INSERT OR REPLACE' if replace else 'INSERT OR IGNORE'
+        cursor = connection.execute(
+            f'{verb} INTO cache (key, value, expires, accessed, size) '
+            'VALUES (?, ?, ?, ?, ?)',
+            (key, blob, self.get_backend_timeout(timeout), time.time(),
+             len(blob)))
+        return cursor.rowcount > 0
+
+    def _after_write(self, count=1):
+        self._writes += count
+        if self._writes >= self._cull_interval:
+            self._writes = 0
+            self._cull()
+
+    def _cull(self):
+        """Удаляет просроченные записи, затем самые давно читаемые."""
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE expires <= ?', (time.time(),))
+            entries, size = connection.execute(
+                'SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache'
+            ).fetchone()
+            over_entries = entries > self._max_entries
+            over_size = self._max_size and size > self._max_size
+            if not (over_entries or over_size):
+                return
+            if self._cull_frequency == 0:
+                connection.execute('DELETE FROM cache')
+                return
+            to_delete = max(entries // self._cull_frequency,
+                            entries - self._max_entries)
+            connection.execute(
+                'DELETE FROM cache WHERE key IN (SELECT key FROM cache '
+                'ORDER BY accessed LIMIT ?)', (to_delete,))
+            if self._max_size:
+                # Объём всё ещё велик — вытесняем по одной старейшей
+                # записи, пока не уложимся
+                (size,) = connection.execute(
+                    'SELECT COALESCE(SUM(size), 0) FROM cache').fetchone()
+                rows = connection.execute(
+                    'SELECT key, size FROM cache ORDER BY accessed')
+                victims = []
+                for key, entry_size in rows:
+                    if size <= self._max_size:
+                        break
+                    victims.append(key)
+                    size -= entry_size
+                self._delete_keys(connection, victims)
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            connection.execute(
+                'DELETE FROM cache WHERE key = ? AND expires <= ?',
+                (key, time.time()))
+            added = self._write(connection, key, value, timeout,
+                                replace=False)
+        self._after_write()
+        return added
+
+    def get(self, key, default=None, version=None):
+        key = self._key(key, version)
+        found = self._fetch(self._connection(), [key])
+        if key not in found:
+            return default
+        return pickle.loads(found[key])
+
+    def get_many(self, keys, version=None):
+        mapping = {self._key(key, version): key for key in keys}
+        found = self._fetch(self._connection(), list(mapping))
+        return {mapping[key]: pickle.loads(value)
+                for key, value in found.items()}
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            self._write(connection, key, value, timeout)
+        self._after_write()
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        with self._transaction() as connection:
+            for key, value in data.items():
+                self._write(connection, self._key(key, version), value,
+                            timeout)
+        self._after_write(len(data))
+        return []
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            cursor = connection.execute(
+                'UPDATE cache SET expires = ? WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (self.get_backend_timeout(timeout), key, time.time()))
+        return cursor.rowcount > 0
+
+    def incr(self, key, delta=1, version=None):
+        """Атомарно: чтение и запись идут в одной BEGIN IMMEDIATE."""
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            row = connection.execute(
+                'SELECT value FROM cache WHERE key = ? '
+                'AND (expires IS NULL OR expires > ?)',
+                (key, time.time())).fetchone()
+            if row is None:
+                raise ValueError("Key '%s' not found" % key)
+            value = pickle.loads(row[0]) + delta
+            blob = self._dumps(value)
+            connection.execute(
+                'UPDATE cache SET value = ?, size = ?, accessed = ? '
+                'WHERE key = ?', (blob, len(blob), time.time(), key))
+        return value
+
+    def has_key(self, key, version=None):
+        key = self._key(key, version)
+        return self._connection().execute(
+            'SELECT 1 FROM cache WHERE key = ? '
+            'AND (expires IS NULL OR expires > ?)',
+            (key, time.time())).fetchone() is not None
+
+    def delete(self, key, version=None):
+        key = self._key(key, version)
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache WHERE key = ?', (key,))
+
+    def delete_many(self, keys, version=None):
+        with self._transaction() as connection:
+            self._delete_keys(
+                connection, [self._key(key, version) for key in keys])
+
+    def clear(self):
+        with self._transaction() as connection:
+            connection.execute('DELETE FROM cache')
+
+    def close(self, **kwargs):
+        # Соединение живёт между запросами: открывать файл каждый раз
+        # дороже, чем держать его открытым
+        pass
+
+
+class _Immediate:
+    """BEGIN IMMEDIATE … COMMIT: запись под блокировкой файла."""
+
+    def __init__(self, connection):
+        self.connection = connection
+
+    def __enter__(self):
+        self.connection.execute('BEGIN IMMEDIATE')
+        return self.connection
+
+    def __exit__(self, exc_type, exc, traceback):
+        if exc_type is None:
+            self.connection.execute('COMMIT')
+        else:
+            self.connection.execute('ROLLBACK')
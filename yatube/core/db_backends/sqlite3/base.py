@@ -0,0 +1,49 @@
+# core/db_backends/sqlite3/base.py
+"""sqlite3 Django с настройкой соединения из settings.
+
+OPTIONS поддерживает два ключа сверх параметров sqlite3.connect:
+
+- pragmas — словарь PRAGMA, выполняемых на каждом новом соединении
+  (WAL, synchronous, mmap_size, busy_timeout, cache_size);
+- transaction_mode — чем открывать atomic(): 'IMMEDIATE' берёт
+  блокировку записи сразу. С обычным BEGIN транзакция, которая сначала
+  читает, а потом пишет, при конкурентной записи получает
+  «database is locked» мгновенно, не дожидаясь busy_timeout.
+"""
+import re
+
+from django.core.exceptions import ImproperlyConfigured
+from django.db.backends.sqlite3 import base
+
+PRAGMA_NAME = re.compile(r'^[a-z_]+$')
+TRANSACTION_MODES = ('DEFERRED', 'IMMEDIATE', 'EXCLUSIVE')
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+
+    def get_connection_params(self):
+        params = super().get_connection_params()
+        self.pragmas = params.pop('pragmas', {})
+        self.transaction_mode = params.pop('transaction_mode', None)
+        for name, value in self.pragmas.items():
+            if not PRAGMA_NAME.match(name) or not isinstance(
+                    value, (int, str)) or not str(value).replace(
+                    '-', '').isalnum():
+                raise ImproperlyConfigured(
+                    f'Недопустимая PRAGMA {name} = {value!r}')
+        if self.transaction_mode not in (None,) + TRANSACTION_MODES:
+            raise ImproperlyConfigured(
+                f'transaction_mode: одно из {", ".join(TRANSACTION_MODES)}')
+        return params
+
+    def get_new_connection(self, conn_params):
+        connection = super().get_new_connection(conn_params)
+        for name, value in self.pragmas.items():
+            connection.execute(f'PRAGMA {name} = {value}')
+        return connection
+
+    def _start_transaction_under_autocommit(self):
+        if self.transaction_mode:
+            self.cursor().execute(f'BEGIN {self.transaction_mode}')
+        else:
+            super()._start_transaction_under_autocommit()
@@ -0,0 +1,133 @@
+# core/db_routers.py
+"""Чтение с реплик, запись — в основную базу.
+
+С реплик читают только безопасные веб-запросы (GET, HEAD, OPTIONS), и
+только если включает ReplicaRoutingMiddleware: команды, фоновые потоки
+и shell всегда работают с основной базой. Пользователь, который что-то
+записал, на REPLICA_PIN_SECONDS закрепляется за основной базой и видит
+свой пост или комментарий сразу.
+
+Сессии, пользователи и типы содержимого всегда читаются с основной
+базы: сессия, созданная при входе, есть только там, и пользователь,
+чья cookie закрепления истекла раньше синхронизации реплики, иначе
+оказался бы разлогинен.
+
+Реплики — алиасы из DATABASE_REPLICAS; их наполняет sync_replica.
+"""
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+
+LAST_WRITE_KEY = 'db:last_write'
+# Cookie «недавно писал в базу»: пока она жива, пользователь читает
+# основную базу и не получает устаревших страниц из кэша
+PIN_COOKIE = 'db_pin'
+# Отметка о записи вне веб-запроса ставится при выборе базы, а коммит
+# случается позже: снимок, начатый меньше чем через столько секунд,
+# считаем устаревшим
+COMMIT_SLACK = 1.0
+# Приложения, которые читают только основную базу
+PRIMARY_APPS = ('auth', 'contenttypes', 'sessions')
+
+_state = threading.local()
+
+
+def synced_key(alias):
+    return f'db:synced:{alias}'
+
+
+@contextmanager
+def replica_reads():
+    """Чтения в этом потоке идут на одну из реплик (одну на весь блок,
+    чтобы запрос видел согласованный снимок)."""
+    _state.replica = (random.choice(s.DATABASE_REPLICAS)
+                      if s.DATABASE_REPLICAS else None)
+    try:
+        yield
+    finally:
+        _state.replica = None
+
+
+def current_replica():
+    return getattr(_state, 'replica', None)
+
+
+@contextmanager
+def tracking_writes():
+    """Записи в блоке (веб-запросе) отмечаются для реплик один раз, на
+    выходе из него, а не при каждом выборе базы."""
+    _state.wrote = False
+    _state.tracking = True
+    try:
+        yield
+    finally:
+        _state.tracking = False
+        if _state.wrote:
+            record_write()
+
+
+def wrote():
+    """Писал ли поток в базу в последнем блоке tracking_writes()."""
+    return getattr(_state, 'wrote', False)
+
+
+def pinned(request):
+    try:
+        return float(request.COOKIES[PIN_COOKIE]) > time.time()
+    except (KeyError, ValueError):
+        return False
+
+
+def record_write():
+    if s.DATABASE_REPLICAS:
+        cache.set(LAST_WRITE_KEY, time.time(), None)
+
+
+def mark_write():
+    _state.wrote = True
+    # Команды и фоновые потоки не знают, когда закончат писать
+    if not getattr(_state, 'tracking', False):
+        record_write()
+
+
+def replica_is_fresh(alias):
+    """Реплика снята после последней записи в основную базу."""
+    values = cache.get_many([synced_key(alias), LAST_WRITE_KEY])
+    synced = values.get(synced_key(alias))
+    last_write = values.get(LAST_WRITE_KEY, 0)
+    return synced is not None and synced >= last_write + COMMIT_SLACK
+
+
+def reading_stale_replica():
+    """Поток читает с реплики, которая может отставать от основной базы.
+
+    Такие страницы нельзя класть в кэш под текущими поколениями: после
+    записи они показывали бы старые данные до следующей записи.
+    """
+    alias = current_replica()
+    return alias is not None and not replica_is_fresh(alias)
+
+
+class PrimaryReplicaRouter:
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label in PRIMARY_APPS:
+            return DEFAULT_DB_ALIAS
+        return current_replica()
+
+    def db_for_write(self, model, **hints):
+        mark_write()
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплики — копии основной базы, объекты из них совместимы
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        # Схема реплик приезжает вместе с данными из sync_replica
+        return db == DEFAULT_DB_ALIAS
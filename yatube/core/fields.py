@@ -0,0 +1,18 @@
+# core/fields.py
+from django.db import models
+
+
+class ImageField(models.ImageField):
+    """ImageField, модель с которым загружается и без файла картинки.
+
+    Размеры хранятся в width_field/height_field. Если их нет, Django
+    читает их из файла, а пропавший из хранилища файл ронял бы каждую
+    загрузку модели; такие размеры остаются пустыми.
+    """
+    def update_dimension_fields(self, instance, force=False, *args,
+                                **kwargs):
+        try:
+            super().update_dimension_fields(instance, force, *args,
+                                            **kwargs)
+        except FileNotFoundError:
+            pass
@@ -0,0 +1,61 @@
+# core/holes.py
+"""«Дырки» в кэшируемых страницах: персональные фрагменты, которые
+дорисовываются при каждой отдаче (аналог edge-side includes).
+
+Тег {% hole 'имя' параметр=значение %} на странице под
+cache_page_by_generations оставляет в HTML метку, а не сам фрагмент,
+поэтому кэш хранит одно тело страницы на всех зрителей. При отдаче
+fill() заменяет метки фрагментами, отрисованными для текущего запроса:
+шапкой с именем пользователя, кнопкой подписки, формой комментария.
+Вне кэшируемых страниц тег сразу рисует фрагмент.
+
+Фрагменты регистрируются декоратором register(); функция получает
+request и параметры метки строками и возвращает HTML.
+"""
+import re
+from urllib.parse import parse_qsl, urlencode
+
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
+
+MARKER = re.compile(rb'<!--hole:(\w+):([^>]*)-->')
+
+_renderers = {}
+
+
+def register(name):
+    def decorator(renderer):
+        _renderers[name] = renderer
+        return renderer
+    return decorator
+
+
+def marker(name, params):
+    # Значения параметров экранирует urlencode, поэтому «-->» внутри
+    # метки не встретится, а текст пользователей в шаблонах экранирован
+    return mark_safe(f'<!--hole:{name}:{urlencode(params)}-->')
+
+
+def render(request, name, params):
+    return mark_safe(_renderers[name](request, **params))
+
+
+def punching(request):
+    """Рисует ли страница метки вместо персональных фрагментов."""
+    return getattr(request, 'punch_holes', False)
+
+
+def fill(request, response):
+    """Заменяет метки в теле ответа фрагментами для этого запроса."""
+    def replace(match):
+        name = match.group(1).decode()
+        params = dict(parse_qsl(match.group(2).decode()))
+        return render(request, name, params).encode()
+
+    response.content = MARKER.sub(replace, response.content)
+    return response
+
+
+@register('header')
+def header(request):
+    return render_to_string('includes/header.html', request=request)
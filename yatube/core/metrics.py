@@ -0,0 +1,187 @@
+# core/metrics.py
+"""Метрики запросов: гистограммы и счётчики в памяти процесса.
+
+Наблюдение — это поиск корзины бинарным поиском и инкремент под
+блокировкой, поэтому сбор можно держать включённым всегда. Каждый
+воркер отдаёт свои значения; Prometheus суммирует их по instance.
+
+Во время запроса MetricsMiddleware кладёт в поток RequestStats, куда
+SQL-обёртка, бэкенд шаблонов, кэш страниц и карточек и генерация
+миниатюр добавляют своё время и счётчики.
+"""
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5,
+                    1.0, 2.5, 5.0, 10.0)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+REGISTRY = []
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    escaped = (str(value).replace('\\', r'\\').replace('"', r'\"')
+               for _, value in pairs)
+    return '{%s}' % ','.join(
+        f'{name}="{value}"' for (name, _), value in zip(pairs, escaped))
+
+
+class Histogram:
+    def __init__(self, name, documentation, labels=(),
+                 buckets=DURATION_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # значения меток -> [счётчики корзин..., +Inf, сумма]
+        self._series = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def observe(self, value, *labels):
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = [0] * (len(self.buckets)
+                                                       + 2)
+            series[index] += 1
+            series[-1] += value
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} histogram'
+        with self._lock:
+            snapshot = {labels: list(series)
+                        for labels, series in self._series.items()}
+        for labels, series in sorted(snapshot.items()):
+            total = 0
+            bounds = [repr(float(bound)) for bound in self.buckets]
+            for bound, count in zip(bounds + ['+Inf'], series[:-1]):
+                total += count
+                yield '%s_bucket%s %d' % (self.name, _format_labels(
+                    self.labels, labels, [('le', bound)]), total)
+            label_text = _format_labels(self.labels, labels)
+            yield f'{self.name}_sum{label_text} {series[-1]!r}'
+            yield f'{self.name}_count{label_text} {total}'
+
+
+class Counter:
+    def __init__(self, name, documentation, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def inc(self, *labels, amount=1):
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0) + amount
+
+    def collect(self):
+        yield f'# HELP {self.name} {self.documentation}'
+        yield f'# TYPE {self.name} counter'
+        with self._lock:
+            snapshot = dict(self._values)
+        for labels, value in sorted(snapshot.items()):
+            yield '%s%s %d' % (self.name,
+                               _format_labels(self.labels, labels), value)
+
+
+REQUEST_SECONDS = Histogram(
+    'yatube_request_duration_seconds', 'Время обработки запроса.',
+    ['view'])
+SQL_SECONDS = Histogram(
+    'yatube_sql_duration_seconds', 'Время SQL-запросов за запрос.',
+    ['view'])
+SQL_QUERIES = Histogram(
+    'yatube_sql_queries', 'Число SQL-запросов за запрос.',
+    ['view'], buckets=QUERY_BUCKETS)
+TEMPLATE_SECONDS = Histogram(
+    'yatube_template_duration_seconds', 'Время рендеринга шаблонов.',
+    ['view'])
+CACHE_LOOKUPS = Counter(
+    'yatube_cache_lookups_total', 'Обращения к кэшу страниц и карточек.',
+    ['view', 'result'])
+THUMBNAIL_SECONDS = Histogram(
+    'yatube_thumbnail_duration_seconds', 'Время генерации миниатюр.')
+
+
+def exposition():
+    """Все метрики в текстовом формате Prometheus."""
+    lines = []
+    for metric in REGISTRY:
+        lines.extend(metric.collect())
+    return '\n'.join(lines) + '\n'
+
+
+class RequestStats:
+    __slots__ = ('sql_count', 'sql_time', 'template_time', 'template_depth',
+                 'cache_hits', 'cache_misses', 'thumbnail_time')
+
+    def __init__(self):
+        self.sql_count = self.template_depth = 0
+        self.cache_hits = self.cache_misses = 0
+        self.sql_time = self.template_time = self.thumbnail_time = 0.0
+
+    def sql_wrapper(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - started
+            self.sql_count += 1
+
+
+_local = threading.local()
+
+
+def current():
+    """Статистика текущего запроса или None вне запроса."""
+    return getattr(_local, 'stats', None)
+
+
+@contextmanager
+def collecting(stats):
+    _local.stats = stats
+    try:
+        yield stats
+    finally:
+        _local.stats = None
+
+
+def count_cache(hits, misses):
+    stats = current()
+    if stats is not None:
+        stats.cache_hits += hits
+        stats.cache_misses += misses
+
+
+@contextmanager
+def template_timer():
+    # Считаем только внешний шаблон: вложенные (карточки постов)
+    # уже входят в его время
+    stats = current()
+    if stats is None or stats.template_depth:
+        yield
+        return
+    stats.template_depth += 1
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.template_depth -= 1
+        stats.template_time += time.perf_counter() - started
+
+
+def observe_thumbnail(seconds):
+    THUMBNAIL_SECONDS.observe(seconds)
+    stats = current()
+    if stats is not None:
+        stats.thumbnail_time += seconds
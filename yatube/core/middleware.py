@@ -0,0 +1,158 @@
+# core/middleware.py
+import logging
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings as s
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+from . import db_routers, metrics, snapshots
+
+logger = logging.getLogger(__name__)
+
+
+class RepeatedQueriesError(Exception):
+    pass
+
+
+class RepeatedQueryMiddleware:
+    """Отладочный middleware: ловит N+1 запросы.
+
+    Считает, сколько раз за запрос выполнился один и тот же SQL-шаблон
+    (текст запроса без параметров). Если какой-то шаблон повторился
+    больше REPEATED_QUERY_THRESHOLD раз, пишет предупреждение в лог,
+    а при REPEATED_QUERY_RAISE = True — бросает RepeatedQueriesError.
+    Запросы, содержащие подстроки из REPEATED_QUERY_IGNORE, не считаются.
+    Выключен, если не задан REPEATED_QUERY_CHECK.
+    """
+
+    def __init__(self, get_response):
+        if not s.REPEATED_QUERY_CHECK:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        shapes = Counter()
+
+        def count_query(execute, sql, params, many, context):
+            if not any(part in sql for part in s.REPEATED_QUERY_IGNORE):
+                shapes[sql] += 1
+            return execute(sql, params, many, context)
+
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(count_query))
+            response = self.get_response(request)
+
+        repeated = {sql: times for sql, times in shapes.items()
+                    if times > s.REPEATED_QUERY_THRESHOLD}
+        if repeated:
+            message = '%s: повторяющиеся запросы: %s' % (
+                request.path,
+                '; '.join(f'{times}x {sql}'
+                          for sql, times in repeated.items()))
+            if s.REPEATED_QUERY_RAISE:
+                raise RepeatedQueriesError(message)
+            logger.warning(message)
+        return response
+
+
+class MetricsMiddleware:
+    """Собирает метрики запроса и отдаёт их в заголовке Server-Timing.
+
+    Для каждого представления (request.resolver_match.view_name) пишет
+    в гистограммы core.metrics общее время, число и время SQL-запросов,
+    время шаблонов и обращения к кэшу страниц и карточек.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        with metrics.collecting(metrics.RequestStats()) as stats, \
+                ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(
+                    connection.execute_wrapper(stats.sql_wrapper))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = request.resolver_match
+        view = match.view_name if match else '<unresolved>'
+        metrics.REQUEST_SECONDS.observe(elapsed, view)
+        metrics.SQL_SECONDS.observe(stats.sql_time, view)
+        metrics.SQL_QUERIES.observe(stats.sql_count, view)
+        metrics.TEMPLATE_SECONDS.observe(stats.template_time, view)
+        if stats.cache_hits:
+            metrics.CACHE_LOOKUPS.inc(view, 'hit', amount=stats.cache_hits)
+        if stats.cache_misses:
+            metrics.CACHE_LOOKUPS.inc(view, 'miss',
+                                      amount=stats.cache_misses)
+
+        timings = [
+            f'sql;dur={stats.sql_time * 1000:.1f};'
+            f'desc="{stats.sql_count} queries"',
+            f'tpl;dur={stats.template_time * 1000:.1f}',
+            f'cache;desc="{stats.cache_hits} hit {stats.cache_misses} miss"',
+        ]
+        if stats.thumbnail_time:
+            timings.append(f'thumb;dur={stats.thumbnail_time * 1000:.1f}')
+        timings.append(f'total;dur={elapsed * 1000:.1f}')
+        response['Server-Timing'] = ', '.join(timings)
+        return response
+
+
+class ReplicaRoutingMiddleware:
+    """Включает чтение с реплик для безопасных запросов.
+
+    Запрос, который записал в базу, ставит cookie: до её истечения
+    (REPLICA_PIN_SECONDS) все запросы пользователя читают основную базу
+    и видят его изменения, даже если реплику ещё не обновили. Та же
+    cookie не даёт кэшу страниц отдать ему устаревшую копию.
+    """
+    cookie_name = db_routers.PIN_COOKIE
+    safe_methods = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        with db_routers.tracking_writes():
+            if (s.DATABASE_REPLICAS and request.method in self.safe_methods
+                    and not db_routers.pinned(request)):
+                with db_routers.replica_reads():
+                    response = self.get_response(request)
+            else:
+                response = self.get_response(request)
+        if db_routers.wrote():
+            response.set_cookie(
+                self.cookie_name, str(time.time() + s.REPLICA_PIN_SECONDS),
+                max_age=s.REPLICA_PIN_SECONDS, httponly=True,
+                samesite='Lax')
+        return response
+
+
+class StaticSnapshotMiddleware:
+    """Отдаёт анонимам статические снимки страниц (core/snapshots.py).
+
+    Стоит последним, чтобы ответ прошёл через SecurityMiddleware и
+    XFrameOptionsMiddleware; сессия и пользователь ленивые, так что
+    действительный снимок отдаётся без базы. Если снимка нет или он
+    устарел, страницу отрисовывает Django, и ответ становится новым
+    снимком.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not snapshots.eligible(request):
+            return self.get_response(request)
+        response = snapshots.serve(request)
+        if response is None:
+            response = self.get_response(request)
+            snapshots.capture(request, response)
+        return response
@@ -1,4 +1,6 @@
 # core/models.py
+from contextlib import contextmanager
+
 from django.db import models
 
 
@@ -14,3 +16,20 @@ class CreatedModel(models.Model):
         # Это абстрактная модель:
         abstract = True
         ordering = ['-created']
+
+
+@contextmanager
+def explicit_created(*models_list):
+    """Отключает auto_now_add у created, чтобы bulk_create мог вставить
+    строки с заданной датой (импорт, генерация данных).
+
+    Дату нужно проставить каждому объекту самостоятельно.
+    """
+    fields = [model._meta.get_field('created') for model in models_list]
+    for field in fields:
+        field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field in fields:
+            field.auto_now_add = True
@@ -0,0 +1,131 @@
+# core/paginator.py
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.paginator import Page, Paginator
+from django.db.models import Q
+
+FORWARD = 'n'
+BACKWARD = 'p'
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def encode_cursor(direction, values):
+    """Упаковывает направление и значения ключа в непрозрачный токен."""
+    raw = json.dumps([direction, values], default=str, separators=(',', ':'))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(token):
+    """Распаковывает токен курсора; при любой ошибке — InvalidCursor."""
+    try:
+        padded = token + '=' * (-len(token) % 4)
+        direction, values = json.loads(base64.urlsafe_b64decode(padded))
+    except (binascii.Error, ValueError, TypeError, UnicodeDecodeError):
+        raise InvalidCursor(token)
+    if direction not in (FORWARD, BACKWARD) or not isinstance(values, list):
+        raise InvalidCursor(token)
+    return direction, values
+
+
+class CursorPage(Page):
+    """Страница keyset-паджинации: знает только соседние курсоры."""
+    is_cursor = True
+
+    def __init__(self, object_list, paginator, next_cursor, previous_cursor):
+        super().__init__(object_list, 1, paginator)
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __repr__(self):
+        return '<Cursor page>'
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+class CursorPaginator(Paginator):
+    """Keyset-паджинатор без COUNT(*) и OFFSET.
+
+    Страница выбирается условием по ключу сортировки (по умолчанию
+    ``(created, id)``), поэтому стоимость запроса не зависит от глубины.
+    ``count`` и ``num_pages`` унаследованы от ``Paginator`` и выполняют
+    COUNT только при явном обращении.
+    """
+
+    def __init__(self, object_list, per_page, ordering=('-created', '-id')):
+        self.ordering = tuple(ordering)
+        super().__init__(object_list.order_by(*self.ordering), per_page)
+
+    def _keys(self):
+        return [(key.lstrip('-'), key.startswith('-'))
+                for key in self.ordering]
+
+    def _values(self, obj):
+        return [getattr(obj, name) for name, _ in self._keys()]
+
+    def _to_python(self, name, value):
+        try:
+            field = self.object_list.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            return value
+        try:
+            return field.to_python(value)
+        except ValidationError:
+            raise InvalidCursor(value)
+
+    def _seek(self, queryset, values, reverse):
+        """Условие «строго после values» в порядке сортировки."""
+        keys = self._keys()
+        if len(values) != len(keys):
+            raise InvalidCursor(values)
+        values = [self._to_python(name, value)
+                  for (name, _), value in zip(keys, values)]
+        condition = Q()
+        for i, (name, descending) in enumerate(keys):
+            lookup = 'lt' if descending != reverse else 'gt'
+            step = Q(**{f'{name}__{lookup}': values[i]})
+            for j, (prev_name, _) in enumerate(keys[:i]):
+                step &= Q(**{prev_name: values[j]})
+            condition |= step
+        return queryset.filter(condition)
+
+    def page_by_cursor(self, token):
+        """Возвращает страницу по токену; битый токен — первая страница."""
+        direction, values = FORWARD, None
+        if token:
+            try:
+                direction, values = decode_cursor(token)
+                return self._build_page(direction, values)
+            except InvalidCursor:
+                direction, values = FORWARD, None
+        return self._build_page(direction, values)
+
+    def _build_page(self, direction, values):
+        queryset = self.object_list
+        reverse = direction == BACKWARD
+        if reverse:
+            queryset = queryset.reverse()
+        if values is not None:
+            queryset = self._seek(queryset, values, reverse)
+        items = list(queryset[:self.per_page + 1])
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if reverse:
+            items.reverse()
+        next_cursor = previous_cursor = None
+        if items:
+            if has_more or reverse:
+                next_cursor = encode_cursor(FORWARD, self._values(items[-1]))
+            if values is not None and (has_more or not reverse):
+                previous_cursor = encode_cursor(
+                    BACKWARD, self._values(items[0]))
+        return CursorPage(items, self, next_cursor, previous_cursor)
@@ -0,0 +1,212 @@
+# core/snapshots.py
+"""Статические снимки страниц для анонимных посетителей.
+
+Первые страницы главной, групп и раздела «О проекте» у всех анонимов
+одинаковы. Их HTML лежит в SNAPSHOT_ROOT/<адрес>/index.html (и рядом
+index.html.gz), а StaticSnapshotMiddleware отдаёт файл до сессий,
+аутентификации и представления, не обращаясь к базе.
+
+Рядом со снимком в кэше хранятся поколения областей (core/cache.py),
+с которых он отрисован. Снимок отдаётся, только пока они совпадают с
+текущими: запись, сменившая поколение, делает его недействительным.
+Первый аноним после изменения получает страницу от Django, и она же
+становится новым снимком; publish_snapshots отрисовывает все сразу.
+"""
+import gzip
+import os
+import re
+import tempfile
+from urllib.parse import quote
+
+from django.conf import settings as s
+from django.contrib.auth.models import AnonymousUser
+from django.core.cache import cache
+from django.http import HttpRequest, HttpResponse
+from django.urls import resolve
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date
+
+from . import metrics
+from .cache import get_generations
+
+META_PREFIX = 'snapshot'
+
+
+def meta_key(path):
+    return f'{META_PREFIX}:{quote(path)}'
+
+
+def file_path(path, compressed=False):
+    parts = [part for part in path.split('/') if part]
+    name = 'index.html.gz' if compressed else 'index.html'
+    return os.path.join(s.SNAPSHOT_ROOT, *parts, name)
+
+
+def eligible(request):
+    """Запрос анонима за страницей, у которой бывает снимок.
+
+    Аноним — запрос без cookie сессии: решаем без обращения к базе.
+    """
+    return (bool(s.SNAPSHOT_ROOT)
+            and request.method in ('GET', 'HEAD')
+            and not request.META.get('QUERY_STRING')
+            and s.SESSION_COOKIE_NAME not in request.COOKIES
+            and any(re.fullmatch(pattern, request.path)
+                    for pattern in s.SNAPSHOT_PATHS))
+
+
+def _write(target, content):
+    """Атомарная запись: читатель видит старый файл или новый целиком."""
+    directory = os.path.dirname(target)
+    # Что лежит в каталоге, отдаётся как страница сайта
+    os.makedirs(directory, mode=0o700, exist_ok=True)
+    descriptor, temporary = tempfile.mkstemp(dir=directory)
+    try:
+        with os.fdopen(descriptor, 'wb') as output:
+            output.write(content)
+        os.replace(temporary, target)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def _remove(path):
+    for compressed in (False, True):
+        try:
+            os.unlink(file_path(path, compressed))
+        except FileNotFoundError:
+            pass
+
+
+def save(path, content, generations, etag=None):
+    """Сохраняет снимок страницы, отрисованной при поколениях
+    generations ({ключ: поколение}), и её ETag.
+
+    Если за время отрисовки поколение сменилось, снимок уже устарел и
+    не сохраняется. Возвращает True, если снимок записан.
+    """
+    keys = list(generations)
+    if get_generations(keys) != list(generations.values()):
+        return False
+    _write(file_path(path), content)
+    if s.SNAPSHOT_GZIP:
+        _write(file_path(path, compressed=True),
+               gzip.compress(content, compresslevel=9))
+    cache.set(meta_key(path), {'generations': generations, 'etag': etag},
+              None)
+    return True
+
+
+def _personal(request):
+    # Cookie CSRF и сессии ставят внешние middleware уже после снимка,
+    # поэтому смотрим, понадобятся ли они этому ответу
+    session = getattr(request, 'session', None)
+    return (request.META.get('CSRF_COOKIE_USED', False)
+            or session is not None and session.modified)
+
+
+def capture(request, response):
+    """Делает снимок из ответа Django на запрос анонима.
+
+    Страницы с поколениями получают их от cache_page_by_generations
+    (response.generations); ответ без них, с cookie (в том числе
+    будущими: CSRF, сессия) или не 200 — нет.
+    """
+    generations = getattr(response, 'generations', None)
+    if (generations is None or response.status_code != 200
+            or response.cookies or response.streaming
+            or _personal(request)):
+        return False
+    return save(request.path, response.content, generations,
+                response.get('ETag'))
+
+
+def render(path):
+    """Отрисовывает страницу для анонима, минуя middleware."""
+    request = HttpRequest()
+    request.method = 'GET'
+    request.path = request.path_info = path
+    request.META = {'SERVER_NAME': s.SNAPSHOT_HOST, 'SERVER_PORT': '80'}
+    request.user = AnonymousUser()
+    match = resolve(path)
+    request.resolver_match = match
+    response = match.func(request, *match.args, **match.kwargs)
+    if hasattr(response, 'render'):
+        response.render()
+    return response
+
+
+def publish(path):
+    """Заново отрисовывает и сохраняет снимок страницы path.
+
+    Страницы без поколений (статические) действительны, пока снимок
+    не перепубликуют.
+    """
+    response = render(path)
+    if response.status_code != 200:
+        _remove(path)
+        cache.delete(meta_key(path))
+        return False
+    return save(path, response.content,
+                getattr(response, 'generations', {}), response.get('ETag'))
+
+
+def accepts_gzip(header):
+    """Принимает ли клиент gzip по Accept-Encoding, с учётом q:
+    «gzip;q=0» — отказ, «*» покрывает не названный gzip."""
+    weights = {}
+    for item in header.split(','):
+        coding, *params = (part.strip() for part in item.split(';'))
+        weight = 1.0
+        for param in params:
+            name, _, value = param.partition('=')
+            if name.strip().lower() == 'q':
+                try:
+                    weight = float(value)
+                except ValueError:
+                    weight = 0.0
+        weights[coding.lower()] = weight
+    return weights.get('gzip', weights.get('*', 0.0)) > 0
+
+
+def gzip_etag(etag):
+    """ETag сжатого снимка: другое представление — другой валидатор
+    («"x"» → «"x-gzip"»), иначе кэши могли бы подменить одно другим."""
+    return f'{etag[:-1]}-gzip"'
+
+
+def serve(request):
+    """Ответ из действительного снимка или None."""
+    meta = cache.get(meta_key(request.path))
+    if meta is None:
+        return None
+    generations = meta['generations']
+    if get_generations(list(generations)) != list(generations.values()):
+        _remove(request.path)
+        cache.delete(meta_key(request.path))
+        return None
+    compressed = s.SNAPSHOT_GZIP and accepts_gzip(
+        request.META.get('HTTP_ACCEPT_ENCODING', ''))
+    try:
+        with open(file_path(request.path, compressed), 'rb') as snapshot:
+            modified = os.fstat(snapshot.fileno()).st_mtime
+            content = snapshot.read()
+    except FileNotFoundError:
+        return None
+    metrics.count_cache(1, 0)
+    response = HttpResponse(content)
+    # Тот же ETag, что у страницы от Django: валидатор клиента не
+    # зависит от того, откуда пришла страница; у сжатой — с суффиксом
+    etag = meta['etag']
+    if etag and compressed:
+        etag = gzip_etag(etag)
+    if etag:
+        response['ETag'] = etag
+    response['Last-Modified'] = http_date(modified)
+    response['Cache-Control'] = 'no-cache'
+    patch_vary_headers(response, ('Accept-Encoding', 'Cookie'))
+    if compressed:
+        response['Content-Encoding'] = 'gzip'
+    return get_conditional_response(
+        request, etag=etag, last_modified=int(modified),
+        response=response)
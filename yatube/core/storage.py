@@ -0,0 +1,68 @@
+# core/storage.py
+"""Хранилище медиафайлов с адресацией по содержимому.
+
+Имя файла — SHA-256 его содержимого: posts/ab/ab12…ef.jpg. Одна и та
+же картинка, загруженная сколько угодно раз, хранится одним файлом и
+получает одни миниатюры, а её адрес и ключи кэша не меняются.
+
+Удалять такой файл можно, только когда на него больше никто не
+ссылается: ссылки считает posts/media.py.
+"""
+import hashlib
+import os
+import re
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+CONTENT_NAME = re.compile(r'(?:.*/)?([0-9a-f]{2})/\1[0-9a-f]{62}(\.\w+)?')
+
+
+def content_hash(content):
+    digest = hashlib.sha256()
+    for chunk in content.chunks():
+        digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    def content_name(self, name, content):
+        """Имя для content в каталоге name, с расширением name."""
+        directory = os.path.dirname(name)
+        extension = os.path.splitext(name)[1].lower()
+        digest = content_hash(content)
+        return os.path.join(directory, digest[:2], digest + extension)
+
+    def is_content_name(self, name):
+        return CONTENT_NAME.fullmatch(name) is not None
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        name = self.content_name(name, content)
+        # Пишем и поверх существующего файла: проверка exists() не спасёт,
+        # если collect() удалит его сразу после неё. Содержимое то же,
+        # а замена атомарна — читатели видят либо старый файл, либо новый
+        self._replace(name, content)
+        return name
+
+    def _replace(self, name, content):
+        path = self.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp = f'{path}.{uuid.uuid4().hex}.tmp'
+        fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_EXCL
+                     | getattr(os, 'O_BINARY', 0), 0o666)
+        try:
+            with os.fdopen(fd, 'wb') as output:
+                for chunk in content.chunks():
+                    output.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp, self.file_permissions_mode)
+            os.replace(temp, path)
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
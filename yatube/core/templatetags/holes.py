@@ -0,0 +1,16 @@
+from django import template
+
+from core import holes
+
+register = template.Library()
+
+
+@register.simple_tag(takes_context=True)
+def hole(context, name, **params):
+    """Персональный фрагмент страницы (см. core/holes.py): на кэшируемой
+    странице — метка, которую заполнят при отдаче, иначе сам фрагмент."""
+    request = context.get('request')
+    if holes.punching(request):
+        return holes.marker(name, params)
+    return holes.render(request, name, {
+        key: str(value) for key, value in params.items()})
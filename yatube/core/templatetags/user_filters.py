@@ -9,6 +9,22 @@ register = template.Library()
 def addclass(field, css):
     return field.as_widget(attrs={'class': css})
 
+
+@register.simple_tag(takes_context=True)
+def url_replace(context, **kwargs):
+    """Строка запроса текущей страницы с заменёнными параметрами.
+
+    Пустое значение убирает параметр; номер страницы ?page=
+    сбрасывается, чтобы не смешивать его с курсором.
+    """
+    query = context['request'].GET.copy()
+    query.pop('page', None)
+    for key, value in kwargs.items():
+        query.pop(key, None)
+        if value:
+            query[key] = value
+    return query.urlencode()
+
 # синтаксис @register... , под который описана функция addclass() -
 # это применение "декораторов", функций, меняющих поведение функций
 # Не бойтесь соб@к
@@ -0,0 +1,47 @@
+# core/test_runner.py
+import os
+import shutil
+import tempfile
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings as s
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+@contextmanager
+def isolated_environment():
+    """Свои файл кэша и каталог снимков на прогон и проверка
+    повторяющихся запросов.
+
+    Кэш и снимки общие для процессов сайта: тесты не должны ни видеть
+    их записи, ни оставлять в них свои. Тесты идут с DEBUG = False,
+    поэтому RepeatedQueryMiddleware включается здесь явно.
+
+    Общее для manage.py test (TestRunner) и pytest (conftest.py):
+    pytest-django TEST_RUNNER не использует.
+    """
+    directory = tempfile.mkdtemp()
+    caches = {'default': dict(
+        s.CACHES['default'],
+        LOCATION=os.path.join(directory, 'cache.sqlite3'))}
+    try:
+        with override_settings(
+                CACHES=caches,
+                SNAPSHOT_ROOT=os.path.join(directory, 'snapshots'),
+                REPEATED_QUERY_CHECK=True, REPEATED_QUERY_RAISE=True):
+            yield
+    finally:
+        shutil.rmtree(directory, ignore_errors=True)
+
+
+class TestRunner(DiscoverRunner):
+    """Запуск тестов в isolated_environment()."""
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._environment = ExitStack()
+        self._environment.enter_context(isolated_environment())
+
+    def teardown_test_environment(self, **kwargs):
+        self._environment.close()
+        super().teardown_test_environment(**kwargs)
@@ -0,0 +1,122 @@
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from unittest import mock
+
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import SimpleTestCase
+
+from ..cache_backends import SQLiteCache
+
+
+def _make_cache(path, **options):
+    return SQLiteCache(path, {'OPTIONS': options})
+
+
+def _increment(path, times):
+    # Выполняется в отдельном процессе со своим соединением
+    cache = _make_cache(path)
+    for _ in range(times):
+        cache.incr('counter')
+
+
+class SQLiteCacheTests(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'cache.sqlite3')
+        self.cache = _make_cache(self.path)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_private_location(self):
+        """Файл кэша создаётся только для владельца; каталог, открытый
+        для записи другим, не используется."""
+        self.cache.set('key', 'value')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        os.chmod(self.directory, 0o777)
+        with self.assertRaises(ImproperlyConfigured):
+            _make_cache(self.path).get('key')
+
+    def test_basic_operations(self):
+        """get/set/add/delete/get_many/set_many работают как у Django."""
+        cache = self.cache
+        self.assertIsNone(cache.get('missing'))
+        cache.set('key', {'a': 1})
+        self.assertEqual(cache.get('key'), {'a': 1})
+        self.assertFalse(cache.add('key', 'other'))
+        self.assertTrue(cache.add('new', 'value'))
+        cache.set_many({'x': 1, 'y': 2})
+        self.assertEqual(cache.get_many(['x', 'y', 'z']), {'x': 1, 'y': 2})
+        cache.delete_many(['x', 'y'])
+        self.assertEqual(cache.get_many(['x', 'y']), {})
+        cache.delete('key')
+        self.assertFalse(cache.has_key('key'))
+
+    def test_expiry(self):
+        """Просроченная запись не возвращается, и add её заменяет."""
+        self.cache.set('key', 'value', 1)
+        self.cache.set('forever', 'value', None)
+        with self._patch_time(time.time() + 2):
+            self.assertIsNone(self.cache.get('key'))
+            self.assertTrue(self.cache.add('key', 'again'))
+            self.assertEqual(self.cache.get('forever'), 'value')
+
+    def _patch_time(self, value):
+        return mock.patch('core.cache_backends.time.time',
+                          return_value=value)
+
+    def test_response_roundtrip(self):
+        """HttpResponse (кэш страниц) переживает сериализацию."""
+        response = HttpResponse('<p>Пост</p>')
+        self.cache.set('page', response)
+        cached = self.cache.get('page')
+        self.assertEqual(cached.content, response.content)
+        self.assertEqual(cached.status_code, 200)
+
+    def test_incr(self):
+        self.cache.set('counter', 10)
+        self.assertEqual(self.cache.incr('counter', 5), 15)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+
+    def test_incr_is_atomic_across_processes(self):
+        """Параллельные incr из разных процессов не теряют обновлений."""
+        self.cache.set('counter', 0)
+        with ProcessPoolExecutor(4) as pool:
+            list(pool.map(_increment, [self.path] * 4, [50] * 4))
+        self.assertEqual(self.cache.get('counter'), 200)
+
+    def test_shared_between_instances(self):
+        """Второй экземпляр (другой воркер) видит те же записи."""
+        self.cache.set('key', 'value')
+        self.assertEqual(_make_cache(self.path).get('key'), 'value')
+
+    def test_lru_eviction_by_entries(self):
+        """Сверх MAX_ENTRIES вытесняются давно не читанные записи."""
+        cache = _make_cache(self.path, MAX_ENTRIES=4, CULL_FREQUENCY=4,
+                            CULL_CHECK_INTERVAL=1)
+        now = time.time()
+        for i in range(4):
+            with self._patch_time(now + i * 10):
+                cache.set(f'key{i}', i)
+        with self._patch_time(now + 100):
+            cache.get('key0')
+        with self._patch_time(now + 110):
+            cache.set('key4', 4)
+        self.assertEqual(cache.get('key0'), 0)
+        self.assertIsNone(cache.get('key1'))
+        self.assertEqual(cache.get('key4'), 4)
+
+    def test_eviction_by_size(self):
+        """Сверх MAX_SIZE записи вытесняются, пока объём не уложится."""
+        cache = _make_cache(self.path, MAX_SIZE=5000, CULL_CHECK_INTERVAL=1)
+        for i in range(10):
+            cache.set(f'key{i}', 'x' * 1000)
+        size = cache._connection().execute(
+            'SELECT SUM(size) FROM cache').fetchone()[0]
+        self.assertLessEqual(size, 5000)
+        self.assertEqual(cache.get('key9'), 'x' * 1000)
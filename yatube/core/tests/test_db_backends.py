@@ -0,0 +1,94 @@
+import os
+import shutil
+import tempfile
+import threading
+
+from django.db import connection, connections, transaction
+from django.test import SimpleTestCase, TestCase
+
+WRITERS = 4
+WRITES = 50
+READERS = 4
+READS = 100
+
+
+class PragmaTests(TestCase):
+    def test_pragmas_applied(self):
+        """PRAGMA из OPTIONS выполняются на каждом новом соединении."""
+        with connection.cursor() as cursor:
+            for pragma, expected in (('synchronous', 1),
+                                     ('busy_timeout', 5000),
+                                     ('cache_size', -64 * 1024)):
+                with self.subTest(pragma=pragma):
+                    cursor.execute(f'PRAGMA {pragma}')
+                    self.assertEqual(cursor.fetchone()[0], expected)
+
+
+class ConcurrencyStressTests(SimpleTestCase):
+    """Конкурентные чтения и записи в файловую базу без «database is
+    locked»: WAL пускает читателей параллельно писателю, а BEGIN IMMEDIATE
+    и busy_timeout выстраивают писателей в очередь."""
+
+    alias = 'stress'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases[self.alias] = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'stress.sqlite3'))
+        self.addCleanup(self._drop_alias)
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('CREATE TABLE item '
+                           '(id INTEGER PRIMARY KEY, value INTEGER)')
+
+    def _drop_alias(self):
+        connections[self.alias].close()
+        delattr(connections._connections, self.alias)
+        del connections.databases[self.alias]
+
+    def _run(self, work, errors):
+        try:
+            work()
+        except Exception as error:
+            errors.append(error)
+        finally:
+            connections[self.alias].close()
+
+    def _write(self):
+        for _ in range(WRITES):
+            # Сначала чтение, потом запись: с BEGIN DEFERRED именно такая
+            # транзакция падает при конкурентной записи
+            with transaction.atomic(using=self.alias), \
+                    connections[self.alias].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*) FROM item')
+                count = cursor.fetchone()[0]
+                cursor.execute('INSERT INTO item (value) VALUES (%s)',
+                               [count])
+
+    def _read(self):
+        for _ in range(READS):
+            with connections[self.alias].cursor() as cursor:
+                cursor.execute('SELECT COUNT(*), MAX(value) FROM item')
+                cursor.fetchone()
+
+    def test_concurrent_reads_and_writes(self):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode')
+            self.assertEqual(cursor.fetchone()[0], 'wal')
+        errors = []
+        threads = [
+            threading.Thread(target=self._run, args=(work, errors))
+            for work in [self._write] * WRITERS + [self._read] * READERS
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*), MAX(value) FROM item')
+            # Каждая запись видела все предыдущие: транзакции не
+            # перемешались
+            self.assertEqual(cursor.fetchone(),
+                             (WRITERS * WRITES, WRITERS * WRITES - 1))
@@ -0,0 +1,177 @@
+import os
+import shutil
+import tempfile
+import time
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.sessions.models import Session
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.http import HttpResponse
+from django.test import (
+    RequestFactory, TestCase, TransactionTestCase, override_settings)
+from django.urls import reverse
+
+from posts.models import Post
+
+from .. import db_routers
+from ..middleware import ReplicaRoutingMiddleware
+
+User = get_user_model()
+
+
+class RouterTests(TestCase):
+    def setUp(self):
+        self.router = db_routers.PrimaryReplicaRouter()
+
+    def test_reads_go_to_primary_outside_web_requests(self):
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_reads_go_to_replica_inside_replica_reads(self):
+        with db_routers.replica_reads():
+            self.assertEqual(self.router.db_for_read(Post), 'replica')
+        self.assertIsNone(self.router.db_for_read(Post))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_writes_go_to_primary(self):
+        """Запись в запросе отмечается для реплик один раз, в конце."""
+        cache.delete(db_routers.LAST_WRITE_KEY)
+        with db_routers.tracking_writes():
+            with db_routers.replica_reads():
+                for _ in range(3):
+                    self.assertEqual(self.router.db_for_write(Post),
+                                     DEFAULT_DB_ALIAS)
+            self.assertIsNone(cache.get(db_routers.LAST_WRITE_KEY))
+        self.assertTrue(db_routers.wrote())
+        self.assertIsNotNone(cache.get(db_routers.LAST_WRITE_KEY))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_sessions_and_users_read_from_primary(self):
+        with db_routers.replica_reads():
+            for model in (Session, User, ContentType):
+                with self.subTest(model=model.__name__):
+                    self.assertEqual(self.router.db_for_read(model),
+                                     DEFAULT_DB_ALIAS)
+
+    def test_migrations_only_on_primary(self):
+        self.assertTrue(self.router.allow_migrate(DEFAULT_DB_ALIAS, 'posts'))
+        self.assertFalse(self.router.allow_migrate('replica', 'posts'))
+
+    @override_settings(DATABASE_REPLICAS=['replica'])
+    def test_replica_freshness(self):
+        """Реплика свежая, только если снята после последней записи."""
+        now = time.time()
+        key = db_routers.synced_key('replica')
+        cache.delete(key)
+        self.assertFalse(db_routers.replica_is_fresh('replica'))
+        cache.set_many({db_routers.LAST_WRITE_KEY: now, key: now - 10})
+        self.assertFalse(db_routers.replica_is_fresh('replica'))
+        cache.set(key, now + 10)
+        self.assertTrue(db_routers.replica_is_fresh('replica'))
+
+
+# Реплика в тестах — сама основная база: данные TestCase живут в его
+# транзакции, и отдельное соединение их не увидело бы
+@override_settings(DATABASE_REPLICAS=[DEFAULT_DB_ALIAS],
+                   REPLICA_PIN_SECONDS=30)
+class ReplicaRoutingMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Writer')
+        cls.post = Post.objects.create(author=cls.user, text='Тестовый пост')
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.seen = None
+
+    def _view(self, request):
+        self.seen = db_routers.current_replica()
+        return HttpResponse()
+
+    def test_safe_request_reads_replica(self):
+        response = ReplicaRoutingMiddleware(self._view)(self.factory.get('/'))
+        self.assertEqual(self.seen, DEFAULT_DB_ALIAS)
+        self.assertNotIn(ReplicaRoutingMiddleware.cookie_name,
+                         response.cookies)
+
+    def test_unsafe_request_reads_primary(self):
+        ReplicaRoutingMiddleware(self._view)(self.factory.post('/'))
+        self.assertIsNone(self.seen)
+
+    def test_pinned_request_reads_primary(self):
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaRoutingMiddleware.cookie_name] = str(
+            time.time() + 10)
+        ReplicaRoutingMiddleware(self._view)(request)
+        self.assertIsNone(self.seen)
+
+    def test_expired_pin_reads_replica(self):
+        request = self.factory.get('/')
+        request.COOKIES[ReplicaRoutingMiddleware.cookie_name] = str(
+            time.time() - 10)
+        ReplicaRoutingMiddleware(self._view)(request)
+        self.assertEqual(self.seen, DEFAULT_DB_ALIAS)
+
+    def test_write_pins_user_to_primary(self):
+        """После комментария ответ ставит cookie закрепления."""
+        client = self.client
+        client.force_login(self.user)
+        response = client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.post.pk}),
+            {'text': 'Комментарий'})
+        cookie = response.cookies[ReplicaRoutingMiddleware.cookie_name]
+        self.assertEqual(cookie['max-age'], 30)
+        self.assertGreater(float(cookie.value), time.time())
+
+    def test_stale_replica_pages_are_not_cached(self):
+        """Страница, прочитанная с отстающей реплики, не попадает в кэш."""
+        cache.clear()
+        cache.set(db_routers.LAST_WRITE_KEY, time.time(), None)
+        response = self.client.get(reverse('posts:index'))
+        self.assertFalse(response.has_header('ETag'))
+        cache.set(db_routers.synced_key(DEFAULT_DB_ALIAS), time.time() + 10,
+                  None)
+        response = self.client.get(reverse('posts:index'))
+        self.assertTrue(response.has_header('ETag'))
+
+
+class SyncReplicaCommandTests(TransactionTestCase):
+    """sync_replica копирует основную базу в файл реплики."""
+
+    alias = 'replica_file'
+
+    def setUp(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory, ignore_errors=True)
+        connections.databases[self.alias] = dict(
+            connection.settings_dict,
+            NAME=os.path.join(directory, 'replica.sqlite3'))
+        self.addCleanup(self._drop_alias)
+
+    def _drop_alias(self):
+        connections[self.alias].close()
+        if hasattr(connections._connections, self.alias):
+            delattr(connections._connections, self.alias)
+        del connections.databases[self.alias]
+
+    def test_sync_copies_primary(self):
+        user = User.objects.create_user(username='Author')
+        Post.objects.create(author=user, text='Первый')
+        call_command('sync_replica', '--database', self.alias,
+                     stdout=StringIO())
+        replica = Post.objects.using(self.alias)
+        self.assertEqual(list(replica.values_list('text', flat=True)),
+                         ['Первый'])
+        synced = cache.get(db_routers.synced_key(self.alias))
+        self.assertLessEqual(synced, time.time())
+        # Повторная синхронизация подхватывает новые записи, а открытое
+        # соединение реплики видит их без переподключения
+        Post.objects.create(author=user, text='Второй')
+        call_command('sync_replica', '--database', self.alias,
+                     stdout=StringIO())
+        self.assertEqual(replica.count(), 2)
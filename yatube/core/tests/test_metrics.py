@@ -0,0 +1,70 @@
+from django.core.cache import cache
+from django.test import Client, TestCase, override_settings
+from django.urls import reverse
+
+from .. import metrics
+
+
+class HistogramTests(TestCase):
+    def test_exposition_format(self):
+        """Гистограмма выводится накопительными корзинами Prometheus."""
+        histogram = metrics.Histogram('test_seconds', 'Тест.', ['view'],
+                                      buckets=(0.1, 1.0))
+        try:
+            histogram.observe(0.05, 'a')
+            histogram.observe(0.5, 'a')
+            histogram.observe(5, 'a')
+            lines = list(histogram.collect())
+        finally:
+            metrics.REGISTRY.remove(histogram)
+        self.assertIn('# TYPE test_seconds histogram', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="0.1"} 1', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="1.0"} 2', lines)
+        self.assertIn('test_seconds_bucket{view="a",le="+Inf"} 3', lines)
+        self.assertIn('test_seconds_count{view="a"} 3', lines)
+        self.assertIn('test_seconds_sum{view="a"} 5.55', lines)
+
+
+class MetricsMiddlewareTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = Client()
+
+    def test_server_timing_header(self):
+        """Ответ несёт Server-Timing с SQL, шаблонами и кэшем."""
+        response = self.client.get(reverse('posts:index'))
+        timing = response['Server-Timing']
+        for part in ('sql;dur=', 'queries', 'tpl;dur=',
+                     'cache;desc="0 hit 1 miss"', 'total;dur='):
+            with self.subTest(part=part):
+                self.assertIn(part, timing)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIn('cache;desc="1 hit 0 miss"',
+                      response['Server-Timing'])
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint(self):
+        """/metrics отдаёт гистограммы по именам представлений."""
+        self.client.get(reverse('posts:index'))
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer secret')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(
+            response,
+            'yatube_request_duration_seconds_count{view="posts:index"}')
+        self.assertContains(response, 'yatube_sql_queries_bucket')
+
+    @override_settings(METRICS_TOKEN='secret')
+    def test_metrics_endpoint_requires_token(self):
+        """С локального адреса без токена /metrics не отдаётся."""
+        for header in ('', 'Bearer wrong', 'secret'):
+            with self.subTest(header=header):
+                response = self.client.get(reverse('metrics'),
+                                           REMOTE_ADDR='127.0.0.1',
+                                           HTTP_AUTHORIZATION=header)
+                self.assertEqual(response.status_code, 404)
+
+    def test_metrics_endpoint_off_by_default(self):
+        response = self.client.get(reverse('metrics'),
+                                   HTTP_AUTHORIZATION='Bearer ')
+        self.assertEqual(response.status_code, 404)
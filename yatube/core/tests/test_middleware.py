@@ -0,0 +1,69 @@
+from django.contrib.auth import get_user_model
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import path
+
+from ..middleware import RepeatedQueriesError, RepeatedQueryMiddleware
+
+User = get_user_model()
+
+
+def n_plus_one(request):
+    # Классический N+1: по запросу на каждого пользователя
+    for pk in User.objects.values_list('pk', flat=True):
+        User.objects.get(pk=pk)
+    return HttpResponse()
+
+
+urlpatterns = [path('n-plus-one/', n_plus_one)]
+
+
+class RepeatedQueryMiddlewareTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.users = [User.objects.create_user(username=f'User{i}')
+                     for i in range(5)]
+
+    def setUp(self):
+        self.request = RequestFactory().get('/')
+
+    def _view(self, request):
+        # Классический N+1: по запросу на каждого пользователя
+        for user in self.users:
+            User.objects.get(pk=user.pk)
+        return HttpResponse()
+
+    @override_settings(REPEATED_QUERY_THRESHOLD=3, REPEATED_QUERY_RAISE=True)
+    def test_repeated_queries_raise(self):
+        """Повтор одного SQL-шаблона сверх порога — ошибка."""
+        middleware = RepeatedQueryMiddleware(self._view)
+        with self.assertRaises(RepeatedQueriesError):
+            middleware(self.request)
+
+    @override_settings(REPEATED_QUERY_THRESHOLD=3, REPEATED_QUERY_RAISE=False)
+    def test_repeated_queries_logged(self):
+        """Без REPEATED_QUERY_RAISE повтор только пишется в лог."""
+        middleware = RepeatedQueryMiddleware(self._view)
+        with self.assertLogs('core.middleware', 'WARNING'):
+            middleware(self.request)
+
+    @override_settings(REPEATED_QUERY_THRESHOLD=5, REPEATED_QUERY_RAISE=True)
+    def test_queries_below_threshold_pass(self):
+        middleware = RepeatedQueryMiddleware(self._view)
+        self.assertEqual(middleware(self.request).status_code, 200)
+
+    @override_settings(REPEATED_QUERY_CHECK=False)
+    def test_disabled_without_setting(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            RepeatedQueryMiddleware(self._view)
+
+    @override_settings(ROOT_URLCONF=__name__, REPEATED_QUERY_THRESHOLD=3,
+                       REPEATED_QUERY_RAISE=False)
+    def test_enabled_in_tests(self):
+        """Тесты идут через RepeatedQueryMiddleware и при DEBUG = False."""
+        with self.assertLogs('core.middleware', 'WARNING') as logs:
+            self.client.get('/n-plus-one/')
+        self.assertIn('/n-plus-one/: повторяющиеся запросы: 5x',
+                      logs.output[0])
@@ -0,0 +1,131 @@
+import gzip
+import os
+import shutil
+import tempfile
+from io import StringIO
+
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from posts.models import Group, Post
+
+from .. import snapshots
+
+User = get_user_model()
+
+SNAPSHOT_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(SNAPSHOT_ROOT=SNAPSHOT_ROOT, SNAPSHOT_GZIP=True)
+class StaticSnapshotTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Author')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Post.objects.create(author=cls.user, group=cls.group,
+                            text='Первый пост')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(SNAPSHOT_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        cache.clear()
+        self.index = reverse('posts:index')
+
+    def test_anonymous_page_becomes_snapshot(self):
+        """Первый аноним получает страницу от Django, второй — файл
+        без единого запроса к базе."""
+        rendered = self.client.get(self.index)
+        self.assertIsNotNone(rendered.context)
+        self.assertTrue(os.path.exists(snapshots.file_path(self.index)))
+        with self.assertNumQueries(0):
+            served = self.client.get(self.index)
+        self.assertIsNone(served.context)
+        self.assertEqual(served.content, rendered.content)
+        self.assertEqual(served['Cache-Control'], 'no-cache')
+
+    def test_gzip_snapshot(self):
+        rendered = self.client.get(self.index)
+        served = self.client.get(self.index, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(served['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(served.content), rendered.content)
+
+    def test_gzip_snapshot_has_own_etag(self):
+        """У сжатого и несжатого снимка разные ETag: валидатор одного
+        не подтверждает другое представление."""
+        self.client.get(self.index)
+        plain = self.client.get(self.index)
+        packed = self.client.get(self.index, HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(packed['ETag'], plain['ETag'][:-1] + '-gzip"')
+        response = self.client.get(self.index, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=plain['ETag'])
+        self.assertEqual(response.status_code, 200)
+        response = self.client.get(self.index, HTTP_ACCEPT_ENCODING='gzip',
+                                   HTTP_IF_NONE_MATCH=packed['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_gzip_refused(self):
+        self.client.get(self.index)
+        for header in ('gzip;q=0', 'br, *;q=0', 'gzip; q=0.0, *'):
+            with self.subTest(header=header):
+                served = self.client.get(self.index,
+                                         HTTP_ACCEPT_ENCODING=header)
+                self.assertNotIn('Content-Encoding', served)
+        served = self.client.get(self.index,
+                                 HTTP_ACCEPT_ENCODING='br, *;q=0.5')
+        self.assertEqual(served['Content-Encoding'], 'gzip')
+
+    @override_settings(SECURE_CONTENT_TYPE_NOSNIFF=True)
+    def test_security_headers(self):
+        """Снимок проходит через SecurityMiddleware и X-Frame-Options."""
+        self.client.get(self.index)
+        served = self.client.get(self.index)
+        self.assertIsNone(served.context)
+        self.assertEqual(served['X-Frame-Options'], 'SAMEORIGIN')
+        self.assertEqual(served['X-Content-Type-Options'], 'nosniff')
+
+    def test_snapshot_invalidated_by_write(self):
+        """Новый пост меняет поколение ленты: снимок больше не отдаётся."""
+        self.client.get(self.index)
+        Post.objects.create(author=self.user, text='Второй пост')
+        response = self.client.get(self.index)
+        self.assertIsNotNone(response.context)
+        self.assertContains(response, 'Второй пост')
+        self.assertContains(self.client.get(self.index), 'Второй пост')
+
+    def test_not_served(self):
+        """Ни пользователю с сессией, ни другим страницам ленты."""
+        self.client.get(self.index)
+        cases = {
+            'query': lambda: self.client.get(self.index, {'cursor': 'x'}),
+            'post': lambda: self.client.get(
+                reverse('posts:post_detail', kwargs={'post_id': 1})),
+        }
+        for name, request in cases.items():
+            with self.subTest(name=name):
+                self.assertIsNotNone(request().context)
+        self.client.force_login(self.user)
+        self.assertIsNotNone(self.client.get(self.index).context)
+
+    def test_conditional_get(self):
+        self.client.get(self.index)
+        served = self.client.get(self.index)
+        response = self.client.get(
+            self.index, HTTP_IF_MODIFIED_SINCE=served['Last-Modified'])
+        self.assertEqual(response.status_code, 304)
+
+    def test_publish_snapshots_command(self):
+        call_command('publish_snapshots', stdout=StringIO())
+        for path in (self.index,
+                     reverse('posts:group_list', kwargs={'slug': 'group'}),
+                     reverse('about:author'), reverse('about:tech')):
+            with self.subTest(path=path):
+                response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+                self.assertIsNone(response.context)
@@ -1,5 +1,11 @@
+import hmac
+
+from django.conf import settings as s
+from django.http import Http404, HttpResponse
 from django.shortcuts import render
 
+from .metrics import exposition
+
 
 def page_not_found(request, exception):
     # Переменная exception содержит отладочную информацию;
@@ -9,3 +15,23 @@ def page_not_found(request, exception):
 
 def csrf_failure(request, reason=''):
     return render(request, 'core/403csrf.html')
+
+
+def _metrics_allowed(request):
+    # Адрес клиента за обратным прокси — адрес самого прокси,
+    # поэтому доступ только по токену
+    if not s.METRICS_TOKEN:
+        return False
+    expected = f'Bearer {s.METRICS_TOKEN}'
+    return hmac.compare_digest(
+        request.META.get('HTTP_AUTHORIZATION', '').encode(),
+        expected.encode())
+
+
+def metrics(request):
+    # Эндпоинт для Prometheus; без токена его не видно
+    if not _metrics_allowed(request):
+        raise Http404
+    return HttpResponse(exposition(),
+                        content_type='text/plain; version=0.0.4; '
+                                     'charset=utf-8')
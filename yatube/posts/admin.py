@@ -1,5 +1,6 @@
 from django.contrib import admin
 
+from . import search
 from .models import Post, Group
 
 
@@ -27,6 +28,12 @@ class PostAdmin(admin.ModelAdmin):
     list_filter = ('created',)
     empty_value_display = '-пусто-'
 
+    def get_search_results(self, request, queryset, search_term):
+        # Тот же полнотекстовый индекс, что и на сайте, вместо LIKE '%...%'
+        if not search_term:
+            return queryset, False
+        return search.search_posts(queryset, search_term), False
+
 
 admin.site.register(Group, GroupAdmin)
 admin.site.register(Post, PostAdmin)
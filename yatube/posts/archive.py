@@ -0,0 +1,105 @@
+# posts/archive.py
+"""Архив старых постов.
+
+archive_before() пачками переносит посты старше отсечки вместе с
+комментариями в таблицы ArchivedPost и ArchivedComment и удаляет их из
+горячих таблиц и лент. Перенос идёт INSERT ... SELECT и DELETE без
+сигналов: счётчики и поколения кэша правятся один раз на пачку.
+
+post_detail и profile находят архивные посты по тем же адресам, а
+ленты, группы и поиск работают только с горячими таблицами.
+"""
+from collections import Counter
+
+from django.conf import settings as s
+from django.db import connection, transaction
+from django.utils import timezone
+
+from core.cache import bump
+from . import counters, generations
+from .models import ArchivedComment, ArchivedPost, Comment, FeedEntry, Post
+
+
+def _in(ids):
+    return 'IN ({})'.format(', '.join(['%s'] * len(ids)))
+
+
+def _copy(source, target, column, ids, archived):
+    """INSERT ... SELECT строк source с column IN ids в таблицу target.
+
+    Колонки у target те же, что у source, плюс необязательная archived.
+    """
+    quote = connection.ops.quote_name
+    columns = [quote(field.column) for field in target._meta.concrete_fields
+               if field.name != 'archived']
+    values = list(columns)
+    params = []
+    if any(field.name == 'archived'
+           for field in target._meta.concrete_fields):
+        columns.append(quote('archived'))
+        values.append('%s')
+        params.append(connection.ops.adapt_datetimefield_value(archived))
+    with connection.cursor() as cursor:
+        cursor.execute('INSERT INTO {} ({}) SELECT {} FROM {} WHERE {} {}'
+                       .format(quote(target._meta.db_table),
+                               ', '.join(columns), ', '.join(values),
+                               quote(source._meta.db_table), quote(column),
+                               _in(ids)), params + ids)
+        return cursor.rowcount
+
+
+def _delete(model, column, ids):
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute('DELETE FROM {} WHERE {} {}'.format(
+            quote(model._meta.db_table), quote(column), _in(ids)), ids)
+
+
+def _archive_batch(posts, archived):
+    """Переносит в архив пачку постов (словари из values()).
+
+    Возвращает число перенесённых комментариев.
+    """
+    ids = [post['pk'] for post in posts]
+    _copy(Post, ArchivedPost, 'id', ids, archived)
+    comments = _copy(Comment, ArchivedComment, 'post_id', ids, archived)
+    # Строки лент удаляются без сигналов и каскадов, одним DELETE
+    FeedEntry.objects.filter(post_id__in=ids).delete()
+    _delete(Comment, 'post_id', ids)
+    _delete(Post, 'id', ids)
+    # Посты автора в архиве по-прежнему входят в его счётчик, а группа
+    # считает только то, что показывает, — горячие посты
+    for group_id, count in Counter(
+            post['group_id'] for post in posts).items():
+        counters.shift_group(group_id, -count)
+    return comments
+
+
+def archive_before(cutoff, batch_size=None):
+    """Переносит в архив посты, созданные раньше cutoff.
+
+    Каждая пачка — отдельная транзакция, поэтому команду можно прервать
+    и запустить снова. Возвращает (постов, комментариев).
+    """
+    batch_size = batch_size or s.ARCHIVE_BATCH_SIZE
+    old = Post.objects.filter(created__lt=cutoff).order_by('created', 'id')
+    total_posts = total_comments = 0
+    while True:
+        with transaction.atomic():
+            posts = list(old.values(
+                'pk', 'group_id', 'group__slug',
+                'author__username')[:batch_size])
+            if not posts:
+                break
+            total_comments += _archive_batch(posts, timezone.now())
+        total_posts += len(posts)
+        # Пост ушёл с главной, из группы и из лент; его страница и
+        # профиль автора теперь читают архив
+        bump(
+            generations.feed_key(),
+            *{generations.group_key(post['group__slug'])
+              for post in posts if post['group__slug']},
+            *{generations.profile_key(post['author__username'])
+              for post in posts},
+            *(generations.post_key(post['pk']) for post in posts))
+    return total_posts, total_comments
@@ -1,7 +1,9 @@
 from django import forms
 
+from django.core.files.uploadedfile import UploadedFile
 from django.utils.translation import gettext_lazy as _
 
+from . import uploads
 from .models import Post, Comment
 
 
@@ -27,6 +29,18 @@ class PostForm(forms.ModelForm):
             'text': forms.Textarea(attrs={'cols': 97, 'rows': 8}),
         }
 
+    def clean_image(self):
+        image = self.cleaned_data.get('image')
+        # Новую загрузку уменьшаем и перекодируем; прежний файл поста и
+        # очистку поля (False) пропускаем как есть
+        if not isinstance(image, UploadedFile):
+            return image
+        try:
+            return uploads.normalize(image)
+        except (OSError, ValueError):
+            raise forms.ValidationError(
+                _('Не удалось обработать картинку.'), code='invalid_image')
+
 
 class CommentForm(forms.ModelForm):
     class Meta:
@@ -0,0 +1,59 @@
+# posts/generations.py
+"""Области кэша страниц постов и их поколения (см. core/cache.py)."""
+from core.cache import bump, generation_key
+
+
+def feed_key():
+    return generation_key('feed')
+
+
+def groups_key():
+    # Названия групп выводятся на страницах постов; меняются редко
+    return generation_key('groups')
+
+
+def authors_key():
+    # Имена авторов выводятся на всех страницах постов; меняются редко
+    return generation_key('authors')
+
+
+def author_key(user_id):
+    # Число постов автора на страницах его постов
+    return generation_key('author', user_id)
+
+
+def group_key(slug):
+    return generation_key('group', slug)
+
+
+def profile_key(username):
+    return generation_key('profile', username)
+
+
+def post_key(post_id):
+    return generation_key('post', post_id)
+
+
+def bump_post(post, *group_slugs):
+    """Пост создан, изменён или удалён."""
+    keys = [feed_key(), profile_key(post.author.username),
+            author_key(post.author_id), post_key(post.pk)]
+    keys.extend(group_key(slug) for slug in group_slugs if slug)
+    bump(*keys)
+
+
+def bump_comments(post_id):
+    bump(post_key(post_id))
+
+
+def bump_group(slug):
+    bump(group_key(slug), groups_key())
+
+
+def bump_profile(username):
+    bump(profile_key(username))
+
+
+def bump_authors():
+    """Изменилось имя пользователя."""
+    bump(authors_key())
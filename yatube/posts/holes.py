@@ -0,0 +1,34 @@
+# posts/holes.py
+"""Персональные фрагменты страниц постов (см. core/holes.py)."""
+from django.template.loader import render_to_string
+
+from core import holes
+
+from .forms import CommentForm
+from .models import Follow
+
+
+@holes.register('switcher')
+def switcher(request, active=''):
+    return render_to_string('posts/includes/switcher.html',
+                            {active: True} if active else {}, request)
+
+
+@holes.register('follow_button')
+def follow_button(request, username):
+    following = request.user.is_authenticated and Follow.objects.filter(
+        user=request.user, author__username=username).exists()
+    return render_to_string('posts/includes/follow_button.html', {
+        'username': username,
+        'following': following,
+    }, request)
+
+
+@holes.register('post_actions')
+def post_actions(request, post_id, author_id):
+    """Ссылка на редактирование для автора и форма комментария."""
+    return render_to_string('posts/includes/post_actions.html', {
+        'post_id': int(post_id),
+        'is_author': str(request.user.pk) == author_id,
+        'form': CommentForm(),
+    }, request)
@@ -0,0 +1,37 @@
+from datetime import datetime, time, timedelta
+
+from django.conf import settings as s
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from posts import archive
+
+
+class Command(BaseCommand):
+    help = ('Переносит старые посты с комментариями в архивные таблицы: '
+            'ленты и индексы горячих таблиц остаются маленькими.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--days', type=int, default=s.ARCHIVE_AFTER_DAYS,
+            help='Архивировать посты старше стольких дней.')
+        parser.add_argument(
+            '--before',
+            help='Архивировать посты, созданные раньше даты ГГГГ-ММ-ДД; '
+                 'заменяет --days.')
+        parser.add_argument('--batch-size', type=int,
+                            default=s.ARCHIVE_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        if options['before']:
+            try:
+                day = datetime.strptime(options['before'], '%Y-%m-%d')
+            except ValueError:
+                raise CommandError('--before ждёт дату в формате ГГГГ-ММ-ДД')
+            cutoff = timezone.make_aware(datetime.combine(day, time.min))
+        else:
+            cutoff = timezone.now() - timedelta(days=options['days'])
+        posts, comments = archive.archive_before(cutoff,
+                                                 options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f'В архив перенесено постов: {posts}, комментариев: {comments}'))
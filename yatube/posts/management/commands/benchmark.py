@@ -0,0 +1,262 @@
+import json
+import os
+import platform
+import random
+import shutil
+import statistics
+import subprocess
+import tempfile
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import (CaptureQueriesContext,
+                               setup_test_environment,
+                               teardown_test_environment)
+from django.urls import reverse
+from django.utils import timezone
+from faker import Faker
+from mixer.backend.django import Mixer
+
+from core.models import explicit_created
+from posts import counters, feed
+from posts.models import Comment, Follow, Group, Post, User
+
+READER = 'benchmark_reader'
+FOLLOWED_AUTHORS = 100
+DETAIL_COMMENTS = 30
+
+
+class Command(BaseCommand):
+    help = ('Нагрузочный бенчмарк публичных страниц на синтетических '
+            'данных: p50/p95/p99 и число запросов, результат — в JSON.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--sizes', type=int, nargs='+', default=[10000, 100000, 1000000],
+            help='Размеры набора данных (число постов), по возрастанию.')
+        parser.add_argument(
+            '--requests', type=int, default=200,
+            help='Запросов на страницу в каждом режиме.')
+        parser.add_argument(
+            '--output', default='benchmark.json',
+            help='Куда записать результаты.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения p95.')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument(
+            '--in-place', action='store_true',
+            help='Не создавать отдельную базу, а дописывать данные в '
+                 'текущую (для тестов).')
+
+    def handle(self, *args, **options):
+        sizes = options['sizes']
+        if sizes != sorted(sizes):
+            raise CommandError('Размеры нужно указать по возрастанию.')
+        if options['requests'] < 2:
+            # Перцентили по одному замеру statistics.quantiles не считает
+            raise CommandError('Нужно хотя бы 2 запроса на страницу.')
+        self.rng = random.Random(options['seed'])
+        self.faker = Faker('ru_RU')
+        self.faker.seed_instance(options['seed'])
+        self.mixer = Mixer(commit=False)
+        # Предложения заранее: Faker на каждый из миллиона постов — долго
+        self.sentences = [self.faker.text(max_nb_chars=200)
+                          for _ in range(1000)]
+        cache_dir = tempfile.mkdtemp()
+        # Свой файл кэша: страницы синтетической базы не должны попасть
+        # в общий кэш, а общий — исказить замеры. Снимки выключены по той
+        # же причине: иначе синтетические страницы легли бы в общий
+        # SNAPSHOT_ROOT, а «тёплые» замеры гостя мерили бы чтение файлов
+        caches = {'default': dict(
+            settings.CACHES['default'],
+            BACKEND='core.cache_backends.SQLiteCache',
+            LOCATION=os.path.join(cache_dir, 'cache.sqlite3'))}
+        try:
+            with override_settings(CACHES=caches, SNAPSHOT_ROOT=None):
+                results = self.run(sizes, options)
+        finally:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+        report = {
+            'commit': self.commit(),
+            'created': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'requests': options['requests'],
+            'seed': options['seed'],
+            'results': results,
+        }
+        with open(options['output'], 'w', encoding='utf-8') as output:
+            json.dump(report, output, ensure_ascii=False, indent=2)
+        self.stdout.write(self.style.SUCCESS(
+            f'Результаты записаны в {options["output"]}'))
+        if options['compare']:
+            self.compare(options['compare'], results)
+
+    def run(self, sizes, options):
+        if options['in_place']:
+            return self.run_sizes(sizes, options['requests'])
+        setup_test_environment()
+        old_name = connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            return self.run_sizes(sizes, options['requests'])
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+
+    def run_sizes(self, sizes, requests):
+        results = {}
+        for size in sizes:
+            started = time.monotonic()
+            self.grow(size)
+            self.stdout.write(
+                f'Набор {size} постов готов за '
+                f'{time.monotonic() - started:.1f} с')
+            results[str(size)] = self.measure_views(requests)
+        return results
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', 'HEAD'], capture_output=True,
+                text=True, check=True, cwd=settings.BASE_DIR,
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
+
+    # Данные
+
+    def blend(self, model, count, **fields):
+        # mixer заполняет поля, которые не заданы явно; сохраняем пачкой
+        if count <= 0:
+            return []
+        objects = self.mixer.cycle(count).blend(model, **fields)
+        return model.objects.bulk_create(objects)
+
+    def grow(self, size):
+        """Дополняет базу до size постов; меньшие наборы — префикс
+        больших, поэтому размеры строятся один из другого."""
+        users = User.objects.count()
+        groups = Group.objects.count()
+        with transaction.atomic():
+            start = users
+            self.blend(User, max(50, size // 200) - users,
+                       username=(f'bench{i}' for i in range(start, 10 ** 9)),
+                       is_staff=False, is_superuser=False)
+            self.blend(Group, max(5, size // 5000) - groups,
+                       slug=(f'bench-{i}' for i in range(groups, 10 ** 9)))
+        reader, _ = User.objects.get_or_create(username=READER)
+        author_ids = list(User.objects.exclude(pk=reader.pk).values_list(
+            'pk', flat=True))
+        group_ids = list(Group.objects.values_list('pk', flat=True))
+        followed = set(Follow.objects.filter(user=reader).values_list(
+            'author_id', flat=True))
+        Follow.objects.bulk_create(
+            Follow(user=reader, author_id=author_id)
+            for author_id in author_ids[:FOLLOWED_AUTHORS]
+            if author_id not in followed)
+
+        now = timezone.now()
+        existing = Post.objects.count()
+        for start in range(existing, size, 5000):
+            batch = []
+            for number in range(start, min(start + 5000, size)):
+                batch.append(Post(
+                    text=self.rng.choice(self.sentences),
+                    author_id=self.rng.choice(author_ids),
+                    group_id=(self.rng.choice(group_ids)
+                              if self.rng.random() < 0.7 else None),
+                    # Новые посты набора — самые свежие
+                    created=now - timedelta(seconds=size - number),
+                ))
+            with transaction.atomic(), explicit_created(Post):
+                Post.objects.bulk_create(batch)
+
+        self.detail_post = Post.objects.order_by('-created', '-id').first()
+        missing = DETAIL_COMMENTS - Comment.objects.filter(
+            post=self.detail_post).count()
+        if missing > 0:
+            self.blend(Comment, missing, post=self.detail_post,
+                       author_id=(self.rng.choice(author_ids)
+                                  for _ in range(missing)))
+        # bulk_create не шлёт сигналов: ленты и счётчики — разом
+        feed.rebuild([reader.pk])
+        counters.reconcile()
+        self.reader = reader
+
+    # Замеры
+
+    def urls(self):
+        group = Group.objects.order_by('-post_count').first()
+        author = self.detail_post.author
+        return {
+            'index': (reverse('posts:index'), False),
+            'group_posts': (reverse('posts:group_list',
+                                    args=(group.slug,)), False),
+            'profile': (reverse('posts:profile',
+                                args=(author.username,)), False),
+            'post_detail': (reverse('posts:post_detail',
+                                    args=(self.detail_post.pk,)), False),
+            'follow_index': (reverse('posts:follow_index'), True),
+        }
+
+    def measure_views(self, requests):
+        guest = Client()
+        reader = Client()
+        reader.force_login(self.reader)
+        results = {}
+        for name, (url, login) in self.urls().items():
+            client = reader if login else guest
+            results[name] = {
+                # cold: кэш пуст, страница собирается из базы
+                'cold': self.measure(client, url, requests, cold=True),
+                'warm': self.measure(client, url, requests, cold=False),
+            }
+            self.stdout.write(
+                f'  {name}: cold p95 {results[name]["cold"]["p95_ms"]} мс, '
+                f'warm p95 {results[name]["warm"]["p95_ms"]} мс')
+        return results
+
+    def measure(self, client, url, requests, cold):
+        timings, queries = [], []
+        client.get(url)
+        for _ in range(requests):
+            if cold:
+                cache.clear()
+            with CaptureQueriesContext(connection) as captured:
+                started = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - started) * 1000)
+            if response.status_code != 200:
+                raise CommandError(
+                    f'{url} ответил {response.status_code}')
+            queries.append(len(captured))
+        cuts = statistics.quantiles(timings, n=100, method='inclusive')
+        return {
+            'p50_ms': round(cuts[49], 2),
+            'p95_ms': round(cuts[94], 2),
+            'p99_ms': round(cuts[98], 2),
+            'queries': round(statistics.mean(queries), 1),
+        }
+
+    def compare(self, path, results):
+        with open(path, encoding='utf-8') as previous_file:
+            previous = json.load(previous_file)['results']
+        for size, views in results.items():
+            for view, modes in views.items():
+                for mode, current in modes.items():
+                    try:
+                        before = previous[size][view][mode]
+                    except KeyError:
+                        continue
+                    change = (current['p95_ms'] / before['p95_ms'] - 1
+                              if before['p95_ms'] else 0)
+                    self.stdout.write(
+                        f'{size} {view} {mode}: p95 {before["p95_ms"]} -> '
+                        f'{current["p95_ms"]} мс ({change:+.0%}), '
+                        f'запросов {before["queries"]} -> '
+                        f'{current["queries"]}')
@@ -0,0 +1,174 @@
+import json
+import os
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from itertools import islice
+
+import django
+from django.core.files import File
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from PIL import Image
+
+from core.cache import bump
+from core.models import explicit_created
+from posts import counters, feed, generations, media, uploads
+from posts.models import Follow, Group, Post, User
+
+
+def _init_worker():
+    # Для start method spawn: в дочернем процессе Django ещё не настроен
+    django.setup()
+
+
+def store_image(path):
+    """Проверяет картинку и кладёт её в хранилище (в дочернем процессе).
+
+    Возвращает (имя файла в хранилище, None) или (None, текст ошибки).
+    """
+    try:
+        with Image.open(path) as image:
+            image.verify()
+        with open(path, 'rb') as source:
+            # Та же нормализация, что у загрузки через форму
+            image = uploads.normalize(
+                File(source, name=os.path.basename(path)))
+            name = default_storage.save('posts/' + image.name, image)
+        return name, None
+    except (OSError, SyntaxError, ValueError,
+            Image.DecompressionBombError) as error:
+        return None, f'{path}: {error}'
+
+
+class Command(BaseCommand):
+    help = ('Массовый импорт постов из NDJSON-манифеста: '
+            'по строке {"text", "author", "group", "image", "created"}.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('manifest', help='Путь к NDJSON-файлу.')
+        parser.add_argument(
+            '--images-dir', default='.',
+            help='Каталог, относительно которого заданы пути картинок.')
+        parser.add_argument(
+            '--batch-size', type=int, default=1000,
+            help='Постов в одной транзакции bulk_create.')
+        parser.add_argument(
+            '--workers', type=int, default=os.cpu_count(),
+            help='Процессов для проверки и сохранения картинок.')
+        parser.add_argument(
+            '--strict', action='store_true',
+            help='Остановить импорт на первой ошибочной строке, а не '
+                 'пропускать такие строки.')
+
+    def handle(self, *args, **options):
+        if not os.path.exists(options['manifest']):
+            raise CommandError(f'Нет файла {options["manifest"]}')
+        self.images_dir = options['images_dir']
+        self.strict = options['strict']
+        # Справочники в памяти вместо запроса на каждую строку
+        self.authors = dict(User.objects.values_list('username', 'pk'))
+        self.groups = dict(Group.objects.values_list('slug', 'pk'))
+        self.touched_authors, self.touched_groups = set(), set()
+        self.errors = 0
+        imported = 0
+        started = time.monotonic()
+        # Соединения с базой не должны достаться дочерним процессам
+        connections.close_all()
+        with open(options['manifest'], encoding='utf-8') as manifest, \
+                ProcessPoolExecutor(options['workers'],
+                                    initializer=_init_worker) as pool:
+            while True:
+                lines = list(islice(manifest, options['batch_size']))
+                if not lines:
+                    break
+                imported += self.import_batch(lines, pool)
+                elapsed = time.monotonic() - started
+                self.stdout.write(
+                    f'Импортировано {imported} постов, '
+                    f'{imported / elapsed:.0f} постов/с')
+        self.post_process()
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово: {imported} постов за {elapsed:.1f} с '
+            f'({imported / max(elapsed, 1e-9):.0f} постов/с), '
+            f'ошибок: {self.errors}'))
+
+    def reject(self, message):
+        """Ошибочная строка: пропускается, а при --strict — стоп."""
+        if self.strict:
+            raise CommandError(message)
+        self.stderr.write(message)
+        self.errors += 1
+
+    def parse(self, line):
+        try:
+            row = json.loads(line)
+            author_id = self.authors[row['author']]
+            created = row.get('created')
+            if created is None:
+                created = timezone.now()
+            else:
+                # Несуществующая дата (месяц 13) — ValueError, не строка —
+                # TypeError, не дата вовсе — None: время не выдумываем
+                created = parse_datetime(created)
+                if created is None:
+                    raise ValueError('не удалось разобрать дату')
+        except (ValueError, KeyError, TypeError) as error:
+            self.reject(f'Пропущена строка {line.strip()!r}: {error}')
+            return None
+        return {
+            'text': row.get('text', ''),
+            'author_id': author_id,
+            'group_id': self.groups.get(row.get('group')),
+            'image': row.get('image'),
+            'created': created,
+        }
+
+    def import_batch(self, lines, pool):
+        rows = [row for row in map(self.parse, lines) if row is not None]
+        paths = [os.path.join(self.images_dir, row['image'])
+                 for row in rows if row['image']]
+        stored = iter(pool.map(store_image, paths,
+                               chunksize=max(1, len(paths) // 32)))
+        posts, sources = [], {}
+        for row in rows:
+            if row['image']:
+                path = os.path.join(self.images_dir, row['image'])
+                row['image'], error = next(stored)
+                if error:
+                    self.reject(error)
+                    continue
+                sources[row['image']] = path
+            posts.append(Post(**row))
+            self.touched_authors.add(row['author_id'])
+            self.touched_groups.add(row['group_id'])
+        with transaction.atomic(), explicit_created(Post):
+            Post.objects.bulk_create(posts)
+            images = Counter(post.image.name for post in posts if post.image)
+            for name, count in images.items():
+                media.retain(name, count)
+                # Файл записан до транзакции: collect() мог удалить его,
+                # пока на него не было ссылок, — пишем заново
+                if not default_storage.exists(name):
+                    store_image(sources[name])
+        return len(posts)
+
+    def post_process(self):
+        """bulk_create не шлёт сигналов: досчитываем то, что они ведут."""
+        readers = Follow.objects.filter(
+            author_id__in=self.touched_authors).values_list('user_id',
+                                                            flat=True)
+        feed.rebuild(set(readers))
+        counters.reconcile()
+        usernames = User.objects.filter(
+            pk__in=self.touched_authors).values_list('username', flat=True)
+        slugs = Group.objects.filter(
+            pk__in=self.touched_groups).values_list('slug', flat=True)
+        bump(generations.feed_key(),
+             *map(generations.profile_key, usernames),
+             *map(generations.author_key, self.touched_authors),
+             *map(generations.group_key, slugs))
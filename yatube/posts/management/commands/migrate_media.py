@@ -0,0 +1,19 @@
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from core.storage import ContentAddressedStorage
+from posts import media
+
+
+class Command(BaseCommand):
+    help = ('Переносит картинки постов под имена по содержимому: '
+            'одинаковые файлы хранятся один раз. Пересчитывает ссылки.')
+
+    def handle(self, *args, **options):
+        if not isinstance(default_storage, ContentAddressedStorage):
+            raise CommandError('DEFAULT_FILE_STORAGE должно быть '
+                               'core.storage.ContentAddressedStorage')
+        moved, missing, files = media.migrate()
+        self.stdout.write(self.style.SUCCESS(
+            f'Перенесено файлов: {moved}, не найдено: {missing}, '
+            f'файлов со ссылками: {files}'))
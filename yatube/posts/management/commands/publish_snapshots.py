@@ -0,0 +1,30 @@
+from django.conf import settings as s
+from django.core.management.base import BaseCommand, CommandError
+from django.urls import reverse
+
+from core import snapshots
+from posts.models import Group
+
+
+class Command(BaseCommand):
+    help = ('Отрисовывает статические снимки страниц для анонимов: '
+            'главной, групп и раздела «О проекте».')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'paths', nargs='*',
+            help='Адреса страниц; по умолчанию — все со снимками.')
+
+    def handle(self, *args, **options):
+        if not s.SNAPSHOT_ROOT:
+            raise CommandError('Снимки выключены: SNAPSHOT_ROOT не задан')
+        paths = options['paths'] or [
+            reverse('posts:index'),
+            *(reverse('posts:group_list', kwargs={'slug': slug})
+              for slug in Group.objects.values_list('slug', flat=True)),
+            reverse('about:author'),
+            reverse('about:tech'),
+        ]
+        published = [path for path in paths if snapshots.publish(path)]
+        self.stdout.write(self.style.SUCCESS(
+            f'Опубликовано снимков: {len(published)} из {len(paths)}'))
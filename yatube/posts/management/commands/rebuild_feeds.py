@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+
+from posts import feed
+
+
+class Command(BaseCommand):
+    help = 'Пересобирает материализованные ленты подписок с нуля.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--user', type=int, action='append', dest='user_ids',
+            help='id читателя; можно указать несколько раз.'
+        )
+
+    def handle(self, *args, **options):
+        readers = feed.rebuild(options['user_ids'])
+        self.stdout.write(self.style.SUCCESS(
+            f'Ленты пересобраны для читателей: {readers}'))
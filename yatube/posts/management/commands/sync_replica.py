@@ -0,0 +1,54 @@
+import sqlite3
+import time
+
+from django.conf import settings as s
+from django.core.cache import cache
+from django.core.management.base import BaseCommand
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from core.db_routers import synced_key
+
+
+def sync(alias):
+    """Копирует основную базу в файл реплики через sqlite backup API.
+
+    Копия пишется одной транзакцией в тот же файл, поэтому открытые
+    соединения реплики видят либо старый снимок, либо новый целиком.
+    Возвращает время начала копирования.
+    """
+    primary = connections[DEFAULT_DB_ALIAS]
+    primary.ensure_connection()
+    started = time.time()
+    target = sqlite3.connect(connections.databases[alias]['NAME'])
+    try:
+        primary.connection.backup(target)
+    finally:
+        target.close()
+    # Снимок содержит всё, что записано до начала копирования
+    cache.set(synced_key(alias), started, None)
+    return started
+
+
+class Command(BaseCommand):
+    help = 'Обновляет SQLite-реплики копией основной базы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--database', action='append', dest='aliases',
+            help='Алиас реплики; по умолчанию — все из DATABASE_REPLICAS.')
+        parser.add_argument(
+            '--interval', type=float,
+            help='Повторять каждые столько секунд, пока не прервут.')
+
+    def handle(self, *args, **options):
+        aliases = (options['aliases'] or s.DATABASE_REPLICAS
+                   or ['replica'])
+        while True:
+            for alias in aliases:
+                started = sync(alias)
+                self.stdout.write(
+                    f'{alias}: {time.time() - started:.2f} с')
+            if not options['interval']:
+                break
+            time.sleep(options['interval'])
+        self.stdout.write(self.style.SUCCESS('Реплики обновлены'))
@@ -0,0 +1,123 @@
+# posts/media.py
+"""Счётчики ссылок постов на файлы хранилища (core/storage.py).
+
+На файл ссылаются строки Post и ArchivedPost; перенос в архив идёт в
+обход сигналов и числа ссылок не меняет. Когда ссылок не остаётся,
+файл и его миниатюры удаляются после коммита. Файлы, загруженные до
+хранилища по содержимому, получают строку при первом recount()
+(migrate_media) и с этого момента учитываются и удаляются так же; до
+него строки нет, и release() их не трогает.
+
+Ссылка учитывается (retain) в той же транзакции, что и запись файла, а
+collect() удаляет строку и файл под той же блокировкой записи (BEGIN
+IMMEDIATE): файл не пропадёт между записью и учётом ссылки.
+"""
+from collections import Counter
+
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import Count
+from sorl.thumbnail import default
+from sorl.thumbnail.images import ImageFile
+
+from . import counters, generations
+from .models import ArchivedPost, MediaFile, Post
+
+
+def retain(name, count=1):
+    if name:
+        MediaFile.objects.get_or_create(name=name)
+        counters.shift(MediaFile.objects.filter(name=name), references=count)
+
+
+def release(name):
+    if name:
+        counters.shift(MediaFile.objects.filter(name=name), references=-1)
+        transaction.on_commit(lambda: collect(name))
+
+
+def collect(name):
+    """Удаляет файл без ссылок вместе с миниатюрами."""
+    with transaction.atomic():
+        deleted, _ = MediaFile.objects.filter(
+            name=name, references=0).delete()
+        if deleted:
+            # kvstore sorl удаляет и файлы миниатюр
+            default.kvstore.delete(ImageFile(name, default_storage))
+            default_storage.delete(name)
+    return bool(deleted)
+
+
+def recount():
+    """Пересчитывает ссылки по Post и ArchivedPost.
+
+    Возвращает число файлов, на которые ссылаются посты.
+    """
+    references = Counter()
+    # Подсчёт под той же блокировкой записи, что и замена таблицы:
+    # иначе ссылки, добавленные между ними, потеряются
+    with transaction.atomic():
+        for model in (Post, ArchivedPost):
+            rows = (model.objects.exclude(image='').order_by()
+                    .values('image').annotate(total=Count('pk')))
+            for row in rows:
+                references[row['image']] += row['total']
+        MediaFile.objects.all().delete()
+        MediaFile.objects.bulk_create(
+            MediaFile(name=name, references=total)
+            for name, total in references.items())
+    return len(references)
+
+
+def bump_posts(name):
+    """Сбрасывает кэш страниц всех постов с картинкой name: файл общий
+    у постов с одинаковой картинкой."""
+    for model in (Post, ArchivedPost):
+        posts = model.objects.filter(image=name).select_related(
+            'author', 'group')
+        for post in posts:
+            generations.bump_post(
+                post, post.group.slug if post.group_id else None)
+
+
+def migrate_file(name):
+    """Переносит файл name под имя по содержимому.
+
+    Возвращает новое имя или None, если файла нет в хранилище.
+    """
+    if default_storage.is_content_name(name):
+        return name
+    with transaction.atomic():
+        try:
+            with default_storage.open(name) as content:
+                new_name = default_storage.save(name, content)
+        except FileNotFoundError:
+            return None
+        retain(new_name, sum(
+            model.objects.filter(image=name).update(image=new_name)
+            for model in (Post, ArchivedPost)))
+    # Страницы постов ссылаются на прежний адрес картинки
+    bump_posts(new_name)
+    default.kvstore.delete(ImageFile(name, default_storage))
+    default_storage.delete(name)
+    return new_name
+
+
+def migrate():
+    """Переносит картинки всех постов в хранилище по содержимому и
+    пересчитывает ссылки.
+
+    Возвращает (перенесено, не найдено, файлов со ссылками).
+    """
+    names = set()
+    for model in (Post, ArchivedPost):
+        names.update(model.objects.exclude(image='')
+                     .values_list('image', flat=True).distinct())
+    moved = missing = 0
+    for name in sorted(names):
+        new_name = migrate_file(name)
+        if new_name is None:
+            missing += 1
+        elif new_name != name:
+            moved += 1
+    return moved, missing, recount()
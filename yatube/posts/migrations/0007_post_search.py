@@ -0,0 +1,16 @@
+from django.conf import settings
+from django.db import migrations
+
+from posts import search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0006_counters'),
+    ]
+
+    operations = [
+        migrations.RunPython(search.install, search.uninstall),
+    ]
@@ -0,0 +1,73 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:25
+
+from django.core.files.images import get_image_dimensions
+from django.core.files.storage import default_storage
+from django.db import migrations, models
+
+from posts import search
+
+
+def fill_dimensions(apps, schema_editor):
+    """Записывает размеры уже загруженных картинок.
+
+    Картинку, которой нет в хранилище, пропускаем: её размеры запишутся,
+    когда файл загрузят заново.
+    """
+    for model_name in ('Post', 'ArchivedPost'):
+        model = apps.get_model('posts', model_name)
+        # values_list, а не экземпляры: при создании экземпляра поля
+        # картинки сами полезли бы за размерами в файл
+        images = model.objects.exclude(image='').values_list('pk', 'image')
+        for pk, name in images.iterator():
+            try:
+                with default_storage.open(name) as image:
+                    width, height = get_image_dimensions(image)
+            except OSError:
+                continue
+            model.objects.filter(pk=pk).update(
+                image_width=width, image_height=height)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0009_archive'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='archivedpost',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AlterField(
+            model_name='archivedpost',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        # AddField пересоздаёт posts_post на SQLite: триггеры поиска на
+        # других таблицах ссылаются на неё и не дают её переименовать
+        migrations.RunPython(search.uninstall, search.install),
+        migrations.AddField(
+            model_name='post',
+            name='image_height',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Высота картинки'),
+        ),
+        migrations.AddField(
+            model_name='post',
+            name='image_width',
+            field=models.PositiveIntegerField(editable=False, null=True, verbose_name='Ширина картинки'),
+        ),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=models.ImageField(blank=True, height_field='image_height', upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        migrations.RunPython(search.install, search.uninstall),
+        migrations.RunPython(fill_dimensions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 2.2.16 on 2026-10-18 02:29
+
+import core.fields
+from django.db import migrations, models
+
+from posts import search
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('posts', '0010_image_dimensions'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='MediaFile',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False, verbose_name='Имя файла')),
+                ('references', models.PositiveIntegerField(default=0, verbose_name='Число ссылок')),
+            ],
+            options={
+                'verbose_name': 'Медиафайл',
+                'verbose_name_plural': 'Медиафайлы',
+            },
+        ),
+        migrations.AlterField(
+            model_name='archivedpost',
+            name='image',
+            field=core.fields.ImageField(blank=True, height_field='image_height', upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        # AlterField пересоздаёт posts_post на SQLite: триггеры поиска на
+        # других таблицах ссылаются на неё и не дают её переименовать
+        migrations.RunPython(search.uninstall, search.install),
+        migrations.AlterField(
+            model_name='post',
+            name='image',
+            field=core.fields.ImageField(blank=True, height_field='image_height', upload_to='posts/', verbose_name='Картинка', width_field='image_width'),
+        ),
+        migrations.RunPython(search.install, search.uninstall),
+    ]
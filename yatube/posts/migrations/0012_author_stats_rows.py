@@ -0,0 +1,40 @@
+# Generated by Django 2.2.16 on 2026-10-18 03:10
+
+from django.conf import settings
+from django.db import migrations
+
+
+def create_author_stats(apps, schema_editor):
+    """Заводит счётчики пользователям, у которых их ещё нет.
+
+    Раньше строка создавалась при первом просмотре профиля; теперь —
+    вместе с пользователем, и чтение ничего не пишет.
+    """
+    User = apps.get_model(settings.AUTH_USER_MODEL)
+    AuthorStats = apps.get_model('posts', 'AuthorStats')
+    Post = apps.get_model('posts', 'Post')
+    ArchivedPost = apps.get_model('posts', 'ArchivedPost')
+    Follow = apps.get_model('posts', 'Follow')
+    users = User.objects.filter(stats__isnull=True).values_list(
+        'pk', flat=True)
+    AuthorStats.objects.bulk_create(
+        AuthorStats(
+            user_id=pk,
+            post_count=(Post.objects.filter(author_id=pk).count()
+                        + ArchivedPost.objects.filter(author_id=pk).count()),
+            follower_count=Follow.objects.filter(author_id=pk).count(),
+            following_count=Follow.objects.filter(user_id=pk).count(),
+        )
+        for pk in users.iterator())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+        ('posts', '0011_media_files'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_author_stats, migrations.RunPython.noop),
+    ]
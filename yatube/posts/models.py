@@ -1,12 +1,36 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth import get_user_model
+from django.urls import reverse
+from core.fields import ImageField
 from core.models import CreatedModel
 
 
 User = get_user_model()
 
 
-class Group(models.Model):
+class CountersModel(models.Model):
+    """Абстрактная модель с денормализованными счётчиками.
+
+    Счётчики меняются только F()-выражениями из posts/counters.py,
+    поэтому обычное сохранение объекта их не перезаписывает.
+    """
+    counter_fields = ()
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding and not args \
+                and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.counter_fields
+            ]
+        super().save(*args, **kwargs)
+
+
+class Group(CountersModel):
     title = models.CharField(verbose_name='Название',
                              help_text='Введите название группы',
                              max_length=200)
@@ -15,12 +39,16 @@ class Group(models.Model):
                             unique=True)
     description = models.TextField(verbose_name='Описание',
                                    help_text='Введите описание группы')
+    post_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0, editable=False)
+
+    counter_fields = ('post_count',)
 
     def __str__(self):
         return self.title
 
 
-class Post(CreatedModel):
+class Post(CountersModel, CreatedModel):
     text = models.TextField(
         verbose_name='Текст', help_text='Введите текст поста',)
     author = models.ForeignKey(
@@ -38,19 +66,49 @@ class Post(CreatedModel):
         help_text='Укажите группу для поста',
         verbose_name='Группа, к которой будет относиться пост'
     )
-    image = models.ImageField(
+    image = ImageField(
         'Картинка',
         upload_to='posts/',
-        blank=True
+        blank=True,
+        width_field='image_width',
+        height_field='image_height',
     )
+    # Размеры картинки: шаблонам не нужно открывать файл
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False)
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев', default=0, editable=False)
+
+    counter_fields = ('comment_count',)
+    is_archived = False
 
     class Meta(CreatedModel.Meta):
         verbose_name = 'Пост'
         verbose_name_plural = 'Посты'
+        # Профиль и группа фильтруют по автору/группе и сортируют по
+        # (-created, -id): индекс отдаёт строки уже в нужном порядке
+        # (id SQLite хранит в конце каждой записи индекса)
+        indexes = [
+            models.Index(fields=['author', 'created'],
+                         name='post_author_created_idx'),
+            models.Index(fields=['group', 'created'],
+                         name='post_group_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        # Запись файла картинки и учёт ссылки на него (post_saved) идут
+        # под одной блокировкой записи: collect() не удалит файл между ними
+        with transaction.atomic():
+            super().save(*args, **kwargs)
 
     def __str__(self):
         return self.text[:15]
 
+    def get_absolute_url(self):
+        return reverse('posts:post_detail', kwargs={'post_id': self.pk})
+
 
 class Comment(CreatedModel):
     text = models.TextField(
@@ -71,6 +129,10 @@ class Comment(CreatedModel):
     class Meta(CreatedModel.Meta):
         verbose_name = 'Комментарий'
         verbose_name_plural = 'Комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='comment_post_created_idx'),
+        ]
 
     def __str__(self):
         return self.text[:15]
@@ -96,3 +158,165 @@ class Follow(CreatedModel):
         constraints = [
             models.UniqueConstraint(fields=['user', 'author'],
                                     name='Повторная подписка невозможна!')]
+
+
+class AuthorStats(models.Model):
+    """Счётчики пользователя, которые ведутся при записи."""
+    user = models.OneToOneField(
+        User,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='stats',
+        verbose_name='Пользователь'
+    )
+    post_count = models.PositiveIntegerField(
+        verbose_name='Число постов', default=0)
+    follower_count = models.PositiveIntegerField(
+        verbose_name='Число подписчиков', default=0)
+    following_count = models.PositiveIntegerField(
+        verbose_name='Число подписок', default=0)
+
+    class Meta:
+        verbose_name = 'Счётчики автора'
+        verbose_name_plural = 'Счётчики авторов'
+
+    def __str__(self):
+        return f'{self.user}: {self.post_count}'
+
+
+class MediaFile(models.Model):
+    """Файл хранилища и число постов, которые на него ссылаются.
+
+    Хранилище адресует файлы по содержимому (core/storage.py), поэтому
+    одну картинку могут делить несколько постов.
+    """
+    name = models.CharField('Имя файла', max_length=255, primary_key=True)
+    references = models.PositiveIntegerField('Число ссылок', default=0)
+
+    class Meta:
+        verbose_name = 'Медиафайл'
+        verbose_name_plural = 'Медиафайлы'
+
+    def __str__(self):
+        return f'{self.name}: {self.references}'
+
+
+class FeedEntry(models.Model):
+    """Строка материализованной ленты подписок: пост в ленте читателя.
+
+    Заполняется при публикации поста и при подписке (см. posts/feed.py),
+    поэтому follow_index читает один индексированный диапазон по user.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Читатель'
+    )
+    post = models.ForeignKey(
+        Post,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Пост'
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор'
+    )
+    # Копия Post.created: лента сортируется без обращения к постам
+    created = models.DateTimeField(verbose_name='Дата создания поста')
+
+    class Meta:
+        ordering = ['-created']
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+        indexes = [
+            models.Index(fields=['user', 'created'],
+                         name='feed_user_created_idx'),
+            models.Index(fields=['user', 'author'],
+                         name='feed_user_author_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'post'],
+                                    name='Пост уже есть в ленте!')]
+
+
+class ArchivedPost(CreatedModel):
+    """Пост, перенесённый в архив командой archive_posts.
+
+    Сохраняет id и поля исходного поста, поэтому ссылки на пост и
+    кэш карточек остаются прежними. Архив только читается: в ленты и
+    поиск он не попадает, комментировать и редактировать его нельзя.
+    """
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_posts',
+        verbose_name='Автор'
+    )
+    group = models.ForeignKey(
+        Group,
+        blank=True,
+        null=True,
+        on_delete=models.SET_NULL,
+        related_name='archived_posts',
+        verbose_name='Группа'
+    )
+    image = ImageField('Картинка', upload_to='posts/', blank=True,
+                       width_field='image_width',
+                       height_field='image_height')
+    image_width = models.PositiveIntegerField(
+        'Ширина картинки', null=True, editable=False)
+    image_height = models.PositiveIntegerField(
+        'Высота картинки', null=True, editable=False)
+    comment_count = models.PositiveIntegerField(
+        verbose_name='Число комментариев', default=0)
+    archived = models.DateTimeField(verbose_name='Дата архивации')
+
+    is_archived = True
+
+    class Meta(CreatedModel.Meta):
+        verbose_name = 'Архивный пост'
+        verbose_name_plural = 'Архивные посты'
+        indexes = [
+            models.Index(fields=['author', 'created'],
+                         name='archpost_author_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[:15]
+
+    def get_absolute_url(self):
+        return reverse('posts:post_detail', kwargs={'post_id': self.pk})
+
+
+class ArchivedComment(CreatedModel):
+    id = models.IntegerField(primary_key=True)
+    text = models.TextField(verbose_name='Текст')
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='archived_comments',
+        verbose_name='Автор'
+    )
+    post = models.ForeignKey(
+        ArchivedPost,
+        on_delete=models.CASCADE,
+        related_name='comments',
+        verbose_name='Пост'
+    )
+
+    class Meta(CreatedModel.Meta):
+        verbose_name = 'Архивный комментарий'
+        verbose_name_plural = 'Архивные комментарии'
+        indexes = [
+            models.Index(fields=['post', 'created'],
+                         name='archcomment_post_created_idx'),
+        ]
+
+    def __str__(self):
+        return self.text[:15]
@@ -0,0 +1,139 @@
+# posts/search.py
+"""Полнотекстовый поиск по постам на SQLite FTS5.
+
+Виртуальная таблица posts_post_fts хранит текст поста, название группы
+и имя автора с rowid = id поста; её синхронизируют триггеры. На других
+СУБД поиск деградирует до icontains по тем же полям.
+"""
+import re
+from contextlib import contextmanager
+
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+FTS_TABLE = 'posts_post_fts'
+
+_AUTHOR_NAME = ("SELECT username || ' ' || first_name || ' ' || last_name "
+                'FROM auth_user WHERE id = {ref}.author_id')
+_GROUP_TITLE = ("COALESCE((SELECT title FROM posts_group "
+                "WHERE id = {ref}.group_id), '')")
+_INSERT = (f'INSERT INTO {FTS_TABLE}(rowid, text, group_title, author_name) '
+           'SELECT {ref}.id, {ref}.text, ' + _GROUP_TITLE + ', ('
+           + _AUTHOR_NAME + ')')
+
+INSTALL_SQL = [
+    f'CREATE VIRTUAL TABLE IF NOT EXISTS {FTS_TABLE} USING fts5('
+    "text, group_title, author_name, tokenize='unicode61')",
+    f'DELETE FROM {FTS_TABLE}',
+    _INSERT.format(ref='posts_post') + ' FROM posts_post',
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'CREATE TRIGGER posts_post_fts_insert AFTER INSERT ON posts_post BEGIN '
+    + _INSERT.format(ref='new') + '; END',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'CREATE TRIGGER posts_post_fts_update '
+    'AFTER UPDATE OF text, group_id, author_id ON posts_post BEGIN '
+    f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; '
+    + _INSERT.format(ref='new') + '; END',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'CREATE TRIGGER posts_post_fts_delete AFTER DELETE ON posts_post BEGIN '
+    f'DELETE FROM {FTS_TABLE} WHERE rowid = old.id; END',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'CREATE TRIGGER posts_group_fts_update '
+    'AFTER UPDATE OF title ON posts_group BEGIN '
+    f'UPDATE {FTS_TABLE} SET group_title = new.title WHERE rowid IN '
+    '(SELECT id FROM posts_post WHERE group_id = new.id); END',
+    'DROP TRIGGER IF EXISTS auth_user_fts_update',
+    'CREATE TRIGGER auth_user_fts_update '
+    'AFTER UPDATE OF username, first_name, last_name ON auth_user BEGIN '
+    f'UPDATE {FTS_TABLE} SET author_name = '
+    "new.username || ' ' || new.first_name || ' ' || new.last_name "
+    'WHERE rowid IN (SELECT id FROM posts_post WHERE author_id = new.id); '
+    'END',
+]
+
+UNINSTALL_SQL = [
+    'DROP TRIGGER IF EXISTS posts_post_fts_insert',
+    'DROP TRIGGER IF EXISTS posts_post_fts_update',
+    'DROP TRIGGER IF EXISTS posts_post_fts_delete',
+    'DROP TRIGGER IF EXISTS posts_group_fts_update',
+    'DROP TRIGGER IF EXISTS auth_user_fts_update',
+    f'DROP TABLE IF EXISTS {FTS_TABLE}',
+]
+
+
+def install(apps, schema_editor):
+    """Создаёт индекс и триггеры и переиндексирует все посты.
+
+    Миграции, пересоздающие таблицу posts_post на SQLite, теряют
+    триггеры и должны вызвать install() повторно.
+    """
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in INSTALL_SQL:
+            schema_editor.execute(sql)
+
+
+def uninstall(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        for sql in UNINSTALL_SQL:
+            schema_editor.execute(sql)
+
+
+@contextmanager
+def suspended():
+    """Снимает триггеры на время массовой вставки постов; на выходе
+    индекс пересобирается целиком — это быстрее триггера на каждую строку.
+    """
+    if connection.vendor != 'sqlite':
+        yield
+        return
+    with connection.cursor() as cursor:
+        for sql in UNINSTALL_SQL:
+            cursor.execute(sql)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            for sql in INSTALL_SQL:
+                cursor.execute(sql)
+
+
+def match_expression(query):
+    """Превращает ввод пользователя в безопасный запрос FTS5.
+
+    Каждое слово берётся в кавычки (синтаксис FTS5 не интерпретируется)
+    и ищется по префиксу; слова объединяются через AND.
+    """
+    words = re.findall(r'\w+', query)
+    return ' '.join('"{}"*'.format(word) for word in words)
+
+
+def search_posts(queryset, query):
+    """Посты из queryset, подходящие под query, с аннотацией rank.
+
+    Меньший rank — более релевантный пост (bm25 в FTS5).
+    """
+    match = match_expression(query)
+    if not match:
+        return queryset.none().annotate(
+            rank=Value(0.0, output_field=FloatField()))
+    if connection.vendor != 'sqlite':
+        words = re.findall(r'\w+', query)
+        condition = Q()
+        for word in words:
+            condition &= (Q(text__icontains=word)
+                          | Q(group__title__icontains=word)
+                          | Q(author__username__icontains=word))
+        return queryset.filter(condition).annotate(
+            rank=Value(0.0, output_field=FloatField()))
+    # Не filter(id__in=RawSQL(...)): Django обернёт подзапрос во вторые
+    # скобки, и SQLite прочитает IN ((...)) как скалярный подзапрос
+    return queryset.extra(
+        where=[f'posts_post.id IN (SELECT rowid FROM {FTS_TABLE} '
+               f'WHERE {FTS_TABLE} MATCH %s)'],
+        params=[match],
+    ).annotate(rank=RawSQL(
+        f'SELECT bm25({FTS_TABLE}) FROM {FTS_TABLE} '
+        f'WHERE {FTS_TABLE} MATCH %s AND rowid = posts_post.id',
+        [match], output_field=FloatField(),
+    ))
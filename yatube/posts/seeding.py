@@ -0,0 +1,184 @@
+# posts/seeding.py
+"""Быстрая генерация синтетических данных для стендов и бенчмарков.
+
+Строки создаются пачками, каждая пачка — в своей транзакции:
+пользователи и группы через bulk_create, а посты, комментарии и подписки,
+которых миллионы, — через executemany готовых кортежей, без построения
+моделей и подготовки значений ORM для каждой строки.
+
+Популярность распределена по Ципфу: небольшая доля авторов получает
+большинство постов и подписчиков, небольшая доля постов — большинство
+комментариев. Одинаковый seed даёт одинаковые данные.
+"""
+import random
+from datetime import timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection, transaction
+from django.utils import timezone
+from faker import Faker
+
+from . import search
+from .models import Comment, Follow, Group, Post, User
+
+
+def zipf_cum_weights(count, exponent):
+    """Накопленные веса Ципфа для рангов 1..count (для random.choices)."""
+    total, weights = 0.0, []
+    for rank in range(1, count + 1):
+        total += rank ** -exponent
+        weights.append(total)
+    return weights
+
+
+class Seeder:
+    def __init__(self, seed=1, exponent=1.1, batch_size=5000, days=365,
+                 prefix='seed'):
+        self.rng = random.Random(seed)
+        self.exponent = exponent
+        self.batch_size = batch_size
+        self.prefix = prefix
+        self.now = timezone.now()
+        self.period = timedelta(days=days).total_seconds()
+        faker = Faker('ru_RU')
+        faker.seed_instance(seed)
+        # Пул текстов: Faker на каждую из миллиона строк — слишком долго
+        self.texts = [faker.text(max_nb_chars=300) for _ in range(2000)]
+        self.first_names = [faker.first_name() for _ in range(200)]
+        self.last_names = [faker.last_name() for _ in range(200)]
+
+    def _created(self):
+        created = self.now - timedelta(
+            seconds=self.rng.random() * self.period)
+        return connection.ops.adapt_datetimefield_value(created)
+
+    def _ranked(self, ids):
+        """ids в случайном (но воспроизводимом) порядке популярности и
+        накопленные веса Ципфа к ним."""
+        ids = sorted(ids)
+        self.rng.shuffle(ids)
+        return ids, zipf_cum_weights(len(ids), self.exponent)
+
+    def _batches(self, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    def _create(self, model, objects):
+        """bulk_create пачками по batch_size.
+
+        Возвращает число новых строк: ignore_conflicts молча пропускает
+        занятые имена, поэтому считаем по таблице до и после.
+        """
+        before = model.objects.count()
+        for batch in self._batches(objects):
+            with transaction.atomic():
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+        return model.objects.count() - before
+
+    def _insert(self, model, names, rows):
+        """executemany пачками: rows — кортежи значений полей names.
+
+        Остальные поля модели получают значения по умолчанию.
+        """
+        fields = [model._meta.get_field(name) for name in names]
+        rest = [field for field in model._meta.concrete_fields
+                if not field.primary_key and field not in fields]
+        defaults = tuple(field.get_db_prep_save(field.get_default(),
+                                                connection)
+                         for field in rest)
+        quote = connection.ops.quote_name
+        sql = 'INSERT INTO {} ({}) VALUES ({})'.format(
+            quote(model._meta.db_table),
+            ', '.join(quote(field.column) for field in fields + rest),
+            ', '.join(['%s'] * (len(fields) + len(rest))))
+        created = 0
+        for batch in self._batches(rows):
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.executemany(sql, [row + defaults for row in batch])
+            created += len(batch)
+        return created
+
+    def users(self, count):
+        start = User.objects.count()
+        password = make_password(None)
+        return self._create(User, (
+            User(username=f'{self.prefix}{number}', password=password,
+                 first_name=self.rng.choice(self.first_names),
+                 last_name=self.rng.choice(self.last_names))
+            for number in range(start, start + count)))
+
+    def groups(self, count):
+        start = Group.objects.count()
+        return self._create(Group, (
+            Group(title=f'Группа {number}',
+                  slug=f'{self.prefix}-{number}',
+                  description=self.rng.choice(self.texts))
+            for number in range(start, start + count)))
+
+    def posts(self, count, group_share=0.7):
+        """Посты по авторам и группам с распределением Ципфа; доля
+        group_share постов попадает в группы."""
+        authors, author_weights = self._ranked(
+            User.objects.values_list('pk', flat=True))
+        groups, group_weights = self._ranked(
+            Group.objects.values_list('pk', flat=True))
+
+        def rows():
+            for _ in range(count):
+                group_id = None
+                if groups and self.rng.random() < group_share:
+                    group_id = self.rng.choices(
+                        groups, cum_weights=group_weights)[0]
+                yield (self.rng.choice(self.texts),
+                       self.rng.choices(authors,
+                                        cum_weights=author_weights)[0],
+                       group_id, self._created())
+
+        fields = ('text', 'author', 'group', 'created')
+        # Дописать немного постов к большой базе дешевле с триггерами,
+        # чем переиндексировать её целиком
+        if count < Post.objects.count():
+            return self._insert(Post, fields, rows())
+        with search.suspended():
+            return self._insert(Post, fields, rows())
+
+    def comments(self, count):
+        """Комментарии: посты-«хиты» получают основную массу."""
+        posts, post_weights = self._ranked(
+            Post.objects.values_list('pk', flat=True))
+        authors = list(User.objects.values_list('pk', flat=True))
+        return self._insert(Comment, ('text', 'post', 'author', 'created'), (
+            (self.rng.choice(self.texts),
+             self.rng.choices(posts, cum_weights=post_weights)[0],
+             self.rng.choice(authors), self._created())
+            for _ in range(count)))
+
+    def follows(self, count):
+        """Подписки: читатель случайный, автор — по Ципфу, поэтому число
+        подписчиков у авторов распределено по степенному закону."""
+        authors, author_weights = self._ranked(
+            User.objects.values_list('pk', flat=True))
+        readers = list(authors)
+        existing = set(Follow.objects.values_list('user_id', 'author_id'))
+
+        def rows():
+            # Самоподписки и повторы пропускаем, поэтому попыток
+            # ограниченное число: в маленькой базе пар может не хватить
+            made = 0
+            for _ in range(count * 3):
+                if made == count:
+                    return
+                pair = (self.rng.choice(readers), self.rng.choices(
+                    authors, cum_weights=author_weights)[0])
+                if pair[0] == pair[1] or pair in existing:
+                    continue
+                existing.add(pair)
+                made += 1
+                yield pair + (self._created(),)
+        return self._insert(Follow, ('user', 'author', 'created'), rows())
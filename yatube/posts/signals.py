@@ -0,0 +1,129 @@
+# posts/signals.py
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import counters, feed, generations, media
+from .models import ArchivedPost, Comment, Follow, Group, Post, User
+
+# Поля имени пользователя, которые выводятся на страницах постов
+USER_NAME_FIELDS = ('username', 'first_name', 'last_name')
+
+
+def _group_slug(post):
+    return post.group.slug if post.group_id else None
+
+
+@receiver(pre_save, sender=Post)
+def post_saving(sender, instance, **kwargs):
+    # Запоминаем прежнюю группу, чтобы перенести пост между счётчиками
+    # и сбросить кэш её страницы, и прежнюю картинку — чтобы отпустить её
+    old = None
+    if not instance._state.adding:
+        old = Post.objects.filter(pk=instance.pk).values_list(
+            'group_id', 'group__slug', 'image').first()
+    (instance._old_group_id, instance._old_group_slug,
+     instance._old_image) = old or (None, None, '')
+
+
+@receiver(post_save, sender=Post)
+def post_saved(sender, instance, created, **kwargs):
+    if created:
+        feed.fan_out(instance)
+        counters.shift_author(instance.author_id, post_count=1)
+        counters.shift_group(instance.group_id, 1)
+    elif instance._old_group_id != instance.group_id:
+        counters.shift_group(instance._old_group_id, -1)
+        counters.shift_group(instance.group_id, 1)
+    if instance._old_image != instance.image.name:
+        media.retain(instance.image.name)
+        media.release(instance._old_image)
+    generations.bump_post(instance, _group_slug(instance),
+                          instance._old_group_slug)
+
+
+@receiver(post_delete, sender=Post)
+def post_deleted(sender, instance, **kwargs):
+    counters.shift_author(instance.author_id, post_count=-1)
+    counters.shift_group(instance.group_id, -1)
+    generations.bump_post(instance, _group_slug(instance))
+    media.release(instance.image.name)
+
+
+@receiver(post_delete, sender=ArchivedPost)
+def archived_post_deleted(sender, instance, **kwargs):
+    # Архивный пост входит в счётчик автора, а в счётчик группы — нет:
+    # его вычли при переносе (posts/archive.py)
+    counters.shift_author(instance.author_id, post_count=-1)
+    generations.bump_post(instance)
+    media.release(instance.image.name)
+
+
+@receiver(post_save, sender=Comment)
+def comment_saved(sender, instance, created, **kwargs):
+    if created:
+        counters.shift_post(instance.post_id, 1)
+    generations.bump_comments(instance.post_id)
+
+
+@receiver(post_delete, sender=Comment)
+def comment_deleted(sender, instance, **kwargs):
+    counters.shift_post(instance.post_id, -1)
+    generations.bump_comments(instance.post_id)
+
+
+@receiver(post_save, sender=Follow)
+def follow_saved(sender, instance, created, **kwargs):
+    if created:
+        feed.backfill(instance.user_id, instance.author_id)
+        counters.shift_author(instance.author_id, follower_count=1)
+        counters.shift_author(instance.user_id, following_count=1)
+        generations.bump_profile(instance.author.username)
+
+
+@receiver(post_delete, sender=Follow)
+def follow_deleted(sender, instance, **kwargs):
+    feed.trim(instance.user_id, instance.author_id)
+    counters.shift_author(instance.author_id, follower_count=-1)
+    counters.shift_author(instance.user_id, following_count=-1)
+    generations.bump_profile(instance.author.username)
+
+
+@receiver(post_save, sender=Group)
+@receiver(post_delete, sender=Group)
+def group_changed(sender, instance, **kwargs):
+    generations.bump_group(instance.slug)
+
+
+@receiver(post_save, sender=User)
+def user_created(sender, instance, created, raw=False, **kwargs):
+    # Фикстуры несут свои строки счётчиков
+    if created and not raw:
+        counters.create_author_stats(instance.pk)
+
+
+@receiver(pre_save, sender=User)
+def user_saving(sender, instance, update_fields=None, **kwargs):
+    # Имя выводится на страницах постов: запоминаем прежнее. Вход
+    # обновляет только last_login — тогда имя не менялось
+    instance._old_names = None
+    if not instance._state.adding and (
+            update_fields is None
+            or set(update_fields) & set(USER_NAME_FIELDS)):
+        instance._old_names = User.objects.filter(pk=instance.pk).values_list(
+            *USER_NAME_FIELDS).first()
+
+
+@receiver(post_save, sender=User)
+def user_renamed(sender, instance, created, **kwargs):
+    names = tuple(getattr(instance, field) for field in USER_NAME_FIELDS)
+    if not created and instance._old_names not in (None, names):
+        generations.bump_authors()
+        generations.bump_profile(instance._old_names[0])
+
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # Кэш переживает пересоздание базы и удаление пользователя: профиль
+    # с тем же именем не должен показать чужую закэшированную страницу
+    generations.bump_profile(instance.username)
@@ -0,0 +1,45 @@
+# posts/templatetags/post_images.py
+from django import template
+
+from posts import thumbnails
+
+register = template.Library()
+
+
+def _srcset(candidates):
+    return ', '.join(f'{url} {width}w' for width, _, url in candidates)
+
+
+@register.inclusion_tag('posts/includes/picture.html')
+def post_picture(image, size, sizes='100vw'):
+    """Картинка поста с вариантами миниатюры для srcset, если они уже
+    готовы, иначе оригинал.
+
+    Недостающие миниатюры ставятся в очередь на генерацию, а пост
+    помечается, чтобы его карточку не кэшировали с оригиналом.
+    """
+    if not image:
+        return {}
+    srcset = thumbnails.ready_srcset(image, size)
+    if srcset is None:
+        thumbnails.queue(image)
+        image.instance.thumbnail_pending = True
+        # Размеры — из полей поста: image.width открыл бы файл
+        return {'src': image.url,
+                'width': getattr(image.instance, image.field.width_field),
+                'height': getattr(image.instance, image.field.height_field)}
+    fallback = srcset.pop(None)
+    # src — самый широкий вариант: его размеры задают пропорции места
+    width, height, src = fallback[-1]
+    return {
+        'sources': [
+            {'type': thumbnails.MIME_TYPES[format_],
+             'srcset': _srcset(candidates)}
+            for format_, candidates in srcset.items()
+        ],
+        'src': src,
+        'srcset': _srcset(fallback),
+        'sizes': sizes,
+        'width': width,
+        'height': height,
+    }
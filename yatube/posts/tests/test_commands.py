@@ -0,0 +1,329 @@
+import json
+import os
+import shutil
+import tempfile
+from datetime import timedelta
+from io import StringIO
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.base import ContentFile
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.management import CommandError, call_command
+from django.db import transaction
+from django.db.models import Count, F
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from ..counters import get_author_stats, reconcile
+from ..models import (
+    ArchivedComment, ArchivedPost, Comment, FeedEntry, Follow, Group,
+    MediaFile, Post)
+from ..search import search_posts
+from ..seeding import Seeder
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ImportPostsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.source_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.source_dir)
+        with open(os.path.join(self.source_dir, 'small.gif'), 'wb') as gif:
+            gif.write(SMALL_GIF)
+        with open(os.path.join(self.source_dir, 'broken.gif'), 'wb') as gif:
+            gif.write(b'not an image')
+
+    def _manifest(self, rows):
+        path = os.path.join(self.source_dir, 'manifest.ndjson')
+        with open(path, 'w', encoding='utf-8') as manifest:
+            for row in rows:
+                manifest.write(json.dumps(row, ensure_ascii=False) + '\n')
+        return path
+
+    def test_import_posts(self):
+        """Импорт создаёт посты, картинки, ленты и счётчики."""
+        manifest = self._manifest([
+            {'text': 'С картинкой', 'author': 'Author', 'group': 'group',
+             'image': 'small.gif', 'created': '2020-01-02T03:04:05+00:00'},
+            {'text': 'Без картинки', 'author': 'Author'},
+            {'text': 'Битая картинка', 'author': 'Author',
+             'image': 'broken.gif'},
+            {'text': 'Неизвестный автор', 'author': 'Nobody'},
+            {'text': 'Плохая дата', 'author': 'Author',
+             'created': '2020-13-45T00:00:00'},
+            {'text': 'Дата не строкой', 'author': 'Author', 'created': 2020},
+            {'text': 'Дата словами', 'author': 'Author', 'created': 'вчера'},
+        ])
+        out = StringIO()
+        call_command('import_posts', manifest, images_dir=self.source_dir,
+                     batch_size=2, workers=1,
+                     stdout=out, stderr=StringIO())
+        self.assertEqual(
+            set(Post.objects.values_list('text', flat=True)),
+            {'С картинкой', 'Без картинки'})
+        self.assertIn('ошибок: 5', out.getvalue())
+        post = Post.objects.get(text='С картинкой')
+        self.assertEqual(post.created.year, 2020)
+        self.assertEqual(post.group, self.group)
+        self.assertTrue(post.image.storage.exists(post.image.name))
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1)
+        self.assertEqual(self.reader.feed.count(), 2)
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+
+    def test_import_strict_stops_on_bad_row(self):
+        manifest = self._manifest([
+            {'text': 'Дата словами', 'author': 'Author', 'created': 'вчера'},
+        ])
+        with self.assertRaises(CommandError):
+            call_command('import_posts', manifest, strict=True, workers=1,
+                         stdout=StringIO(), stderr=StringIO())
+        self.assertFalse(Post.objects.exists())
+
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=10)
+    def test_import_normalizes_images(self):
+        """Картинки импорта проходят ту же нормализацию, что загрузки."""
+        Image.new('RGB', (40, 20), 'red').save(
+            os.path.join(self.source_dir, 'big.bmp'))
+        manifest = self._manifest([
+            {'text': 'Большая картинка', 'author': 'Author',
+             'image': 'big.bmp'},
+        ])
+        call_command('import_posts', manifest, images_dir=self.source_dir,
+                     workers=1, stdout=StringIO(), stderr=StringIO())
+        post = Post.objects.get()
+        self.assertTrue(post.image.name.endswith('.jpg'))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (10, 5))
+
+
+class BenchmarkCommandTests(TestCase):
+    def test_benchmark_writes_report(self):
+        """Бенчмарк пишет перцентили и число запросов по каждой странице."""
+        output = os.path.join(tempfile.mkdtemp(), 'benchmark.json')
+        self.addCleanup(shutil.rmtree, os.path.dirname(output))
+        snapshot_root = os.path.join(os.path.dirname(output), 'snapshots')
+        with override_settings(SNAPSHOT_ROOT=snapshot_root):
+            call_command('benchmark', '--in-place', '--sizes', '60',
+                         '--requests', '3', '--output', output,
+                         stdout=StringIO())
+        # Синтетические страницы не попадают в снимки
+        self.assertFalse(os.path.exists(snapshot_root))
+        with open(output, encoding='utf-8') as report_file:
+            report = json.load(report_file)
+        self.assertEqual(Post.objects.count(), 60)
+        views = report['results']['60']
+        self.assertEqual(set(views), {'index', 'group_posts', 'profile',
+                                      'post_detail', 'follow_index'})
+        for name, modes in views.items():
+            with self.subTest(view=name):
+                self.assertEqual(set(modes), {'cold', 'warm'})
+                self.assertEqual(
+                    set(modes['cold']),
+                    {'p50_ms', 'p95_ms', 'p99_ms', 'queries'})
+
+    def test_benchmark_needs_two_requests(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', '--in-place', '--sizes', '60',
+                         '--requests', '1', stdout=StringIO())
+
+
+class SeedCommandTests(TestCase):
+    def _seed(self):
+        call_command('seed', '--users', '30', '--groups', '3', '--posts',
+                     '400', '--comments', '300', '--follows', '60',
+                     '--batch-size', '100', stdout=StringIO())
+        return list(Post.objects.order_by('pk').values_list(
+            'text', 'author__username', 'group__slug', 'created'))
+
+    def test_seed_creates_consistent_data(self):
+        """seed создаёт строки, ленты и счётчики, как при обычной работе."""
+        self._seed()
+        self.assertEqual(User.objects.count(), 30)
+        self.assertEqual(Group.objects.count(), 3)
+        self.assertEqual(Post.objects.count(), 400)
+        self.assertEqual(Comment.objects.count(), 300)
+        self.assertEqual(Follow.objects.count(), 60)
+        self.assertFalse(Follow.objects.filter(user=F('author')).exists())
+        expected = sum(Post.objects.filter(author_id=author_id).count()
+                       for author_id in Follow.objects.values_list(
+                           'author_id', flat=True))
+        self.assertEqual(FeedEntry.objects.count(), expected)
+        for group in Group.objects.all():
+            self.assertEqual(group.post_count, group.posts.count())
+        # Поиск переиндексирован после вставки без триггеров
+        text = Post.objects.first().text.split()[0]
+        self.assertTrue(search_posts(Post.objects.all(), text).exists())
+
+    def test_seed_counts_only_created_rows(self):
+        """Пропущенные из-за занятого имени строки не считаются."""
+        User.objects.create_user(username='seed1')
+        self.assertEqual(Seeder().users(3), 2)
+        self.assertEqual(User.objects.count(), 3)
+
+    def test_seed_is_skewed(self):
+        """У самого плодовитого автора постов намного больше медианы."""
+        self._seed()
+        counts = sorted(Post.objects.order_by().values('author').annotate(
+            total=Count('pk')).values_list('total', flat=True))
+        self.assertGreater(counts[-1], 4 * counts[len(counts) // 2])
+
+    def test_seed_is_deterministic(self):
+        with transaction.atomic():
+            first = self._seed()
+            transaction.set_rollback(True)
+        self.assertFalse(Post.objects.exists())
+        second = self._seed()
+        self.assertEqual([row[:3] for row in first],
+                         [row[:3] for row in second])
+
+
+class ArchivePostsCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        Follow.objects.create(user=cls.reader, author=cls.author)
+        cls.old = Post.objects.create(author=cls.author, group=cls.group,
+                                      text='Старый пост')
+        cls.fresh = Post.objects.create(author=cls.author, group=cls.group,
+                                        text='Свежий пост')
+        Comment.objects.create(post=cls.old, author=cls.reader,
+                               text='Старый комментарий')
+        Post.objects.filter(pk=cls.old.pk).update(
+            created=timezone.now() - timedelta(days=100))
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+        call_command('archive_posts', days=30, stdout=StringIO())
+
+    def test_old_posts_moved_to_archive(self):
+        """Старый пост с комментариями уходит из горячих таблиц и лент."""
+        self.assertEqual(list(Post.objects.all()), [self.fresh])
+        self.assertFalse(Comment.objects.exists())
+        self.assertEqual(
+            list(FeedEntry.objects.values_list('post_id', flat=True)),
+            [self.fresh.pk])
+        archived = ArchivedPost.objects.get(pk=self.old.pk)
+        self.assertEqual((archived.text, archived.comment_count),
+                         ('Старый пост', 1))
+        self.assertEqual(
+            list(ArchivedComment.objects.values_list('post_id', 'text')),
+            [(self.old.pk, 'Старый комментарий')])
+
+    def test_counters(self):
+        """Группа считает горячие посты, автор — все, и reconcile
+        согласен с этим."""
+        self._assert_counts()
+        reconcile()
+        self._assert_counts()
+
+    def test_deleted_archived_post_leaves_counters(self):
+        """Удалённый архивный пост уходит из счётчика автора, а счётчик
+        группы, где его уже нет, не меняется."""
+        ArchivedPost.objects.get(pk=self.old.pk).delete()
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(get_author_stats(author).post_count, 1)
+        self.assertEqual(reconcile(), 0)
+
+    def _assert_counts(self):
+        self.group.refresh_from_db()
+        self.assertEqual(self.group.post_count, 1)
+        author = User.objects.get(pk=self.author.pk)
+        self.assertEqual(get_author_stats(author).post_count, 2)
+
+    def test_archived_post_detail(self):
+        """Архивный пост открывается по прежнему адресу, только чтение."""
+        response = self.client.get(
+            reverse('posts:post_detail', kwargs={'post_id': self.old.pk}))
+        self.assertEqual(response.context['post'], ArchivedPost.objects.get(
+            pk=self.old.pk))
+        self.assertContains(response, 'Старый комментарий')
+        self.assertNotContains(response, 'id="comment-form"')
+        response = self.client.post(
+            reverse('posts:add_comment', kwargs={'post_id': self.old.pk}),
+            {'text': 'Новый'})
+        self.assertEqual(response.status_code, 404)
+
+    def test_profile_links_to_archive(self):
+        url = reverse('posts:profile', kwargs={'username': 'Author'})
+        response = self.client.get(url)
+        self.assertEqual(list(response.context['page_obj']), [self.fresh])
+        self.assertTrue(response.context['has_archive'])
+        response = self.client.get(url, {'archive': 1})
+        self.assertEqual([post.pk for post in response.context['page_obj']],
+                         [self.old.pk])
+
+    def test_rerun_is_noop(self):
+        out = StringIO()
+        call_command('archive_posts', days=30, stdout=out)
+        self.assertIn('постов: 0', out.getvalue())
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class MigrateMediaCommandTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.author = User.objects.create_user(username='Author')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def test_legacy_images_deduplicated(self):
+        """Файлы со старыми именами переезжают под имя по содержимому,
+        копии одной картинки — в один файл."""
+        legacy = FileSystemStorage()
+        names = [legacy.save(f'posts/{name}', ContentFile(SMALL_GIF))
+                 for name in ('meme.gif', 'repost.gif')]
+        posts = [Post.objects.create(text='Пост', author=self.author,
+                                     image=name) for name in names]
+        Post.objects.create(text='Без файла', author=self.author,
+                            image='posts/missing.gif')
+        out = StringIO()
+        call_command('migrate_media', stdout=out)
+        self.assertIn('Перенесено файлов: 2, не найдено: 1', out.getvalue())
+        for post in posts:
+            post.refresh_from_db()
+        name = posts[0].image.name
+        self.assertEqual(posts[1].image.name, name)
+        self.assertTrue(default_storage.is_content_name(name))
+        self.assertTrue(default_storage.exists(name))
+        for old_name in names:
+            with self.subTest(old_name=old_name):
+                self.assertFalse(legacy.exists(old_name))
+        self.assertEqual(MediaFile.objects.get(name=name).references, 2)
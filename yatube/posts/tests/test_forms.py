@@ -1,11 +1,14 @@
+import hashlib
 import shutil
 import tempfile
+from io import BytesIO
 
 from django.contrib.auth import get_user_model
 from django.conf import settings
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.test import Client, TestCase, override_settings
 from django.urls import reverse
+from PIL import Image
 
 from posts.forms import PostForm
 from posts.models import Group, Post, Comment
@@ -88,11 +91,15 @@ class PostCreateFormTests(TestCase):
             follow=True
         )
         added_post = Post.objects.all().first()
+        # Хранилище называет файлы по SHA-256 содержимого (уже
+        # перекодированного при загрузке)
+        with added_post.image.open() as image:
+            digest = hashlib.sha256(image.read()).hexdigest()
         added_post_check_dict = {
             added_post.text: self.form_data['text'],
             added_post.group.pk: self.form_data['group'],
             added_post.author: self.form_data['author'],
-            added_post.image: 'posts/' + self.uploaded.name,
+            added_post.image: f'posts/{digest[:2]}/{digest}.gif',
         }
         self.assertRedirects(response, reverse('posts:profile',
                              kwargs={'username':
@@ -102,6 +109,39 @@ class PostCreateFormTests(TestCase):
             with self.subTest(expected=expected):
                 self.assertEqual(expected, real)
 
+    @override_settings(IMAGE_UPLOAD_MAX_SIDE=100)
+    def test_create_post_normalizes_image(self):
+        """Большая картинка уменьшается, поворачивается по EXIF и теряет
+        метаданные, а её размеры записываются в пост."""
+        photo = BytesIO()
+        exif = Image.Exif()
+        # Ориентация 6: снимок повёрнут на 90° по часовой стрелке
+        exif[0x0112] = 6
+        Image.new('RGB', (300, 200), 'red').save(photo, 'JPEG', exif=exif)
+        self.form_data['image'] = SimpleUploadedFile(
+            'photo.jpg', photo.getvalue(), 'image/jpeg')
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data=self.form_data)
+        post = Post.objects.get(text=self.form_data['text'])
+        self.assertEqual((post.image_width, post.image_height), (67, 100))
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.size, (67, 100))
+            self.assertFalse(image.getexif())
+
+    def test_create_post_cmyk_image_drops_profile(self):
+        """CMYK-картинка переводится в RGB без CMYK-профиля."""
+        photo = BytesIO()
+        Image.new('CMYK', (30, 20)).save(photo, 'JPEG',
+                                         icc_profile=b'cmyk profile')
+        self.form_data['image'] = SimpleUploadedFile(
+            'photo.jpg', photo.getvalue(), 'image/jpeg')
+        self.authorized_client.post(reverse('posts:post_create'),
+                                    data=self.form_data)
+        post = Post.objects.get(text=self.form_data['text'])
+        with Image.open(post.image.path) as image:
+            self.assertEqual(image.mode, 'RGB')
+            self.assertNotIn('icc_profile', image.info)
+
     def test_edit_post_authorized(self):
         response = self.authorized_client.post(
             reverse('posts:post_edit', kwargs={'post_id': f'{self.post.id}'}),
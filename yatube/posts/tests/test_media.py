@@ -0,0 +1,78 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+
+from .. import media
+from ..models import MediaFile, Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+SMALL_GIF = (
+    b'\x47\x49\x46\x38\x39\x61\x02\x00'
+    b'\x01\x00\x80\x00\x00\x00\x00\x00'
+    b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+    b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+    b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+    b'\x0A\x00\x3B'
+)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT)
+class ContentAddressedMediaTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def _post(self, filename):
+        return Post.objects.create(
+            text='Пост с картинкой', author=self.user,
+            image=SimpleUploadedFile(filename, SMALL_GIF, 'image/gif'))
+
+    def test_same_image_stored_once(self):
+        """Одинаковые картинки под разными именами — один файл."""
+        first, second = self._post('meme.gif'), self._post('repost.gif')
+        self.assertEqual(first.image.name, second.image.name)
+        self.assertTrue(default_storage.is_content_name(first.image.name))
+        self.assertEqual(
+            MediaFile.objects.get(name=first.image.name).references, 2)
+
+    def test_file_removed_with_last_reference(self):
+        first, second = self._post('meme.gif'), self._post('repost.gif')
+        name = first.image.name
+        first.delete()
+        self.assertFalse(media.collect(name))
+        self.assertTrue(default_storage.exists(name))
+        second.delete()
+        self.assertTrue(media.collect(name))
+        self.assertFalse(default_storage.exists(name))
+        self.assertFalse(MediaFile.objects.filter(name=name).exists())
+
+    def test_existing_file_rewritten(self):
+        """Файл пишется и при совпадении имени: его мог удалить collect()."""
+        name = self._post('meme.gif').image.name
+        default_storage.delete(name)
+        self.assertEqual(self._post('repost.gif').image.name, name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_replaced_image_released(self):
+        post = self._post('meme.gif')
+        old_name = post.image.name
+        post.image = SimpleUploadedFile('other.gif', SMALL_GIF + b'\x00',
+                                        'image/gif')
+        post.save()
+        self.assertNotEqual(post.image.name, old_name)
+        self.assertEqual(MediaFile.objects.get(name=old_name).references, 0)
+        self.assertEqual(
+            MediaFile.objects.get(name=post.image.name).references, 1)
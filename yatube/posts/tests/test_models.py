@@ -1,7 +1,8 @@
 from django.contrib.auth import get_user_model
 from django.test import TestCase
 
-from ..models import Group, Post
+from ..counters import get_author_stats, reconcile
+from ..models import AuthorStats, Comment, Follow, Group, Post
 
 User = get_user_model()
 
@@ -96,3 +97,82 @@ class GroupModelTests(TestCase):
             with self.subTest(field=field):
                 self.assertEqual(
                     post._meta.get_field(field).help_text, expected_value)
+
+
+class CountersTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='auth')
+        cls.reader = User.objects.create_user(username='reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.other_group = Group.objects.create(title='Другая', slug='other')
+
+    def _refresh(self, *objects):
+        for obj in objects:
+            obj.refresh_from_db()
+
+    def test_counters_follow_writes(self):
+        """Счётчики меняются при создании и удалении объектов."""
+        get_author_stats(self.user)
+        get_author_stats(self.reader)
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   group=self.group)
+        comment = Comment.objects.create(text='Коммент', post=post,
+                                         author=self.reader)
+        follow = Follow.objects.create(user=self.reader, author=self.user)
+        self._refresh(post, self.group, self.user.stats, self.reader.stats)
+        self.assertEqual(post.comment_count, 1)
+        self.assertEqual(self.group.post_count, 1)
+        self.assertEqual(self.user.stats.post_count, 1)
+        self.assertEqual(self.user.stats.follower_count, 1)
+        self.assertEqual(self.reader.stats.following_count, 1)
+
+        post.group = self.other_group
+        post.save()
+        comment.delete()
+        follow.delete()
+        self._refresh(post, self.group, self.other_group,
+                      self.user.stats, self.reader.stats)
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.group.post_count, 0)
+        self.assertEqual(self.other_group.post_count, 1)
+        self.assertEqual(self.user.stats.follower_count, 0)
+        self.assertEqual(self.reader.stats.following_count, 0)
+
+    def test_save_does_not_overwrite_counters(self):
+        """Сохранение устаревшего объекта не затирает счётчик."""
+        post = Post.objects.create(text='Пост', author=self.user)
+        Comment.objects.create(text='Коммент', post=post, author=self.user)
+        post.text = 'Отредактированный пост'
+        post.save()
+        post.refresh_from_db()
+        self.assertEqual(post.comment_count, 1)
+
+    def test_author_stats_created_with_user(self):
+        self.assertTrue(AuthorStats.objects.filter(user=self.user).exists())
+
+    def test_author_stats_read_does_not_write(self):
+        """Без строки счётчики считаются, но на чтении не сохраняются."""
+        Post.objects.create(text='Пост', author=self.user)
+        AuthorStats.objects.filter(user=self.user).delete()
+        user = User.objects.get(pk=self.user.pk)
+        self.assertEqual(get_author_stats(user).post_count, 1)
+        self.assertFalse(AuthorStats.objects.filter(user=user).exists())
+        reconcile()
+        self.assertEqual(AuthorStats.objects.get(user=user).post_count, 1)
+
+    def test_reconcile_fixes_drift(self):
+        """reconcile() возвращает счётчики к реальным значениям."""
+        post = Post.objects.create(text='Пост', author=self.user,
+                                   group=self.group)
+        get_author_stats(self.user)
+        Group.objects.update(post_count=7)
+        Post.objects.update(comment_count=3)
+        AuthorStats.objects.update(post_count=0)
+        self.assertGreater(reconcile(), 0)
+        self.assertEqual(reconcile(), 0)
+        self._refresh(post, self.group, self.user.stats)
+        self.assertEqual(self.group.post_count, 1)
+        self.assertEqual(post.comment_count, 0)
+        self.assertEqual(self.user.stats.post_count, 1)
@@ -0,0 +1,76 @@
+from django.contrib.auth import get_user_model
+from django.test import TestCase
+from django.urls import reverse
+
+from ..models import Group, Post
+from ..search import match_expression, search_posts
+
+User = get_user_model()
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='Писатель')
+        cls.group = Group.objects.create(title='Котоводы', slug='cats')
+        cls.cat_post = Post.objects.create(
+            text='Кот кот и ещё раз кот', author=cls.user)
+        cls.dog_post = Post.objects.create(
+            text='Пёс и немного про кота', author=cls.user, group=cls.group)
+        cls.other_post = Post.objects.create(
+            text='Совсем о другом', author=cls.user)
+
+    def _found(self, query):
+        return list(search_posts(Post.objects.all(), query)
+                    .order_by('rank', '-id'))
+
+    def test_match_expression_escapes_syntax(self):
+        """Операторы FTS5 во вводе пользователя не интерпретируются."""
+        self.assertEqual(match_expression('кот" OR * NEAR('),
+                         '"кот"* "OR"* "NEAR"*')
+        self.assertEqual(match_expression('  ""  '), '')
+
+    def test_search_ranks_by_relevance(self):
+        """Поиск ищет по префиксу и ставит релевантные посты выше."""
+        self.assertEqual(self._found('кот'), [self.cat_post, self.dog_post])
+        self.assertEqual(self._found('котоводы'), [self.dog_post])
+        self.assertEqual(self._found('писатель другом'), [self.other_post])
+        self.assertEqual(self._found(''), [])
+
+    def test_index_follows_writes(self):
+        """Триггеры обновляют индекс при правке постов, групп и авторов."""
+        post = Post.objects.get(pk=self.other_post.pk)
+        post.text = 'Теперь про енотов'
+        post.save()
+        self.assertEqual(self._found('енот'), [post])
+        Group.objects.filter(pk=self.group.pk).update(title='Собаководы')
+        self.assertEqual(self._found('собаководы'), [self.dog_post])
+        User.objects.filter(pk=self.user.pk).update(username='Автор')
+        self.assertEqual(len(self._found('автор')), 3)
+        post.delete()
+        self.assertEqual(self._found('енот'), [])
+
+    def test_search_views_paginate_by_cursor(self):
+        """Страница и API поиска листаются курсором."""
+        for i in range(12):
+            Post.objects.create(text=f'Кот номер {i}', author=self.user)
+        response = self.client.get(reverse('posts:search'), {'q': 'кот'})
+        page_obj = response.context['page_obj']
+        self.assertEqual(len(page_obj), 10)
+        self.assertContains(response, 'q=%D0%BA%D0%BE%D1%82&amp;cursor=')
+        data = self.client.get(reverse('posts:search_api'),
+                               {'q': 'кот', 'cursor': page_obj.next_cursor}
+                               ).json()
+        self.assertEqual(len(data['results']), 4)
+        self.assertIsNone(data['next'])
+        first_page = {post.pk for post in page_obj}
+        self.assertFalse(first_page & {row['id'] for row in data['results']})
+
+    def test_admin_search_uses_index(self):
+        admin = User.objects.create_superuser('admin', 'a@a.ru', 'pass')
+        self.client.force_login(admin)
+        response = self.client.get(
+            reverse('admin:posts_post_changelist'), {'q': 'котоводы'})
+        self.assertEqual(list(response.context['cl'].result_list),
+                         [self.dog_post])
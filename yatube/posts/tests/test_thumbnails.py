@@ -0,0 +1,120 @@
+import shutil
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.template.loader import render_to_string
+from django.test import TestCase, override_settings
+from sorl.thumbnail import get_thumbnail
+
+from core.cache import get_generations
+
+from .. import generations, thumbnails
+from ..models import Post
+
+User = get_user_model()
+
+TEMP_MEDIA_ROOT = tempfile.mkdtemp(dir=settings.BASE_DIR)
+
+
+@override_settings(MEDIA_ROOT=TEMP_MEDIA_ROOT, THUMBNAIL_WORKERS=0)
+class ThumbnailsTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.user = User.objects.create_user(username='TestUser')
+        small_gif = (
+            b'\x47\x49\x46\x38\x39\x61\x02\x00'
+            b'\x01\x00\x80\x00\x00\x00\x00\x00'
+            b'\xFF\xFF\xFF\x21\xF9\x04\x00\x00'
+            b'\x00\x00\x00\x2C\x00\x00\x00\x00'
+            b'\x02\x00\x01\x00\x00\x02\x02\x0C'
+            b'\x0A\x00\x3B'
+        )
+        cls.post = Post.objects.create(
+            text='Пост с картинкой',
+            author=cls.user,
+            image=SimpleUploadedFile('small.gif', small_gif, 'image/gif'),
+        )
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(TEMP_MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        # kvstore sorl-thumbnail живёт и в кэше
+        cache.clear()
+
+    def test_card_falls_back_to_original_until_ready(self):
+        """Пока миниатюры нет, карточка выводит оригинал."""
+        post = Post.objects.get(pk=self.post.pk)
+        html = render_to_string('posts/includes/post_list.html',
+                                {'post': post})
+        self.assertIn(post.image.url, html)
+        self.assertTrue(post.thumbnail_pending)
+
+        thumbnails.generate(post.image.name)
+        thumbnail = thumbnails.ready_thumbnail(post.image, 'card')
+        self.assertIsNotNone(thumbnail)
+        post = Post.objects.get(pk=self.post.pk)
+        html = render_to_string('posts/includes/post_list.html',
+                                {'post': post})
+        self.assertIn(thumbnail.url, html)
+        self.assertNotIn(post.image.url, html)
+
+    def test_names_match_sorl(self):
+        """Имена миниатюр и их вариантов для srcset совпадают с именами
+        sorl: модуль вычисляет их внутренними методами sorl (версия
+        закреплена в requirements.txt)."""
+        for size, (geometry, options) in thumbnails.THUMBNAIL_SIZES.items():
+            all_variants = [(geometry, options)] + [
+                (variant_geometry, variant_options)
+                for _, _, variant_geometry, variant_options
+                in thumbnails.variants(size)]
+            for geometry, options in all_variants:
+                with self.subTest(size=size, geometry=geometry,
+                                  options=options):
+                    thumbnail = get_thumbnail(self.post.image, geometry,
+                                              **options)
+                    self.assertEqual(
+                        thumbnails._thumbnail_file(
+                            self.post.image, geometry, options).name,
+                        thumbnail.name)
+
+    def test_generate_bumps_every_post_with_image(self):
+        """Готовые миниатюры сбрасывают кэш всех постов с той же
+        картинкой, а не только поставившего их в очередь."""
+        twin = Post.objects.create(text='Та же картинка', author=self.user,
+                                   image=self.post.image.name)
+        key = generations.post_key(twin.pk)
+        before = get_generations([key])
+        thumbnails.generate(self.post.image.name)
+        self.assertNotEqual(get_generations([key]), before)
+
+    def test_card_srcset(self):
+        """Готовая карточка — <picture> с вариантами ширин и форматов."""
+        thumbnails.generate(self.post.image.name)
+        post = Post.objects.get(pk=self.post.pk)
+        html = render_to_string('posts/includes/post_list.html',
+                                {'post': post})
+        srcset = thumbnails.ready_srcset(post.image, 'card')
+        self.assertIn('<source type="image/webp"', html)
+        for width, height, url in srcset['WEBP'] + srcset[None]:
+            with self.subTest(url=url):
+                self.assertIn(f'{url} {width}w', html)
+        self.assertIn('width="960" height="339"', html)
+        self.assertIn('loading="lazy"', html)
+
+    def test_queue_generates_every_size_after_commit(self):
+        """queue() после коммита создаёт миниатюры всех размеров."""
+        with mock.patch.object(thumbnails.transaction, 'on_commit',
+                               lambda callback: callback()):
+            thumbnails.queue(self.post.image)
+        for size in thumbnails.THUMBNAIL_SIZES:
+            with self.subTest(size=size):
+                self.assertIsNotNone(
+                    thumbnails.ready_thumbnail(self.post.image, size))
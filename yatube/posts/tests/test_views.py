@@ -5,14 +5,26 @@ from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
 from django.conf import settings as s
 from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.test import RequestFactory, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
 
+import hashlib
 import shutil
 import tempfile
 
 import math
+import time
+from unittest import skipUnless
+from io import StringIO
 
-from ..models import Post, Group, Comment, Follow
+from ..models import Post, Group, Comment, Follow, FeedEntry
+from .. import thumbnails
 from ..forms import PostForm
+from ..templatetags.post_cards import card_key
+from core.cache import acquire, page_slot_key, release
+from core.db_routers import PIN_COOKIE
 
 User = get_user_model()
 
@@ -39,6 +51,9 @@ class PagesTests(TestCase):
             content=small_gif,
             content_type='image/gif'
         )
+        # Хранилище называет файлы по SHA-256 содержимого
+        digest = hashlib.sha256(small_gif).hexdigest()
+        cls.image_name = f'posts/{digest[:2]}/{digest}.gif'
         cls.group = Group.objects.create(
             title='Тестовая группа',
             description='Тестовое описание',
@@ -98,7 +113,7 @@ class PagesTests(TestCase):
             first_object.text: self.post.text,
             first_object.author: self.user,
             first_object.group: self.group,
-            first_object.image: f'posts/{self.uploaded}',
+            first_object.image: self.image_name,
         }
         return first_object_fields
 
@@ -180,18 +195,193 @@ class PagesTests(TestCase):
             group=self.group,
             text='Пост на удаление для проверки кэширования.'
         )
-        responce = self.authorized_client.get(self.index_reverse).content
+        responce = self.guest_client.get(self.index_reverse).content
+        # Повторный запрос отдаётся из кэша, не трогая базу
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                responce,
+                self.guest_client.get(self.index_reverse).content
+            )
+        # Удаление поста сразу меняет поколение ленты и страницу
         temp_post.delete()
-        self.assertEqual(
-            responce,
-            self.authorized_client.get(self.index_reverse).content
-        )
-        cache.clear()
         self.assertNotEqual(
             responce,
-            self.authorized_client.get(self.index_reverse).content
+            self.guest_client.get(self.index_reverse).content
         )
 
+    def test_cached_body_shared_with_personal_holes(self):
+        """Тело страницы кэшируется одно на всех, а шапку и действия
+        с постом каждый зритель получает свои."""
+        other_client = Client()
+        other_client.force_login(self.author)
+        guest = self.guest_client.get(self.post_reverse)
+        author = self.authorized_client.get(self.post_reverse)
+        other = other_client.get(self.post_reverse)
+        for response in (author, other):
+            self.assertIn('cache;desc="1 hit 0 miss"',
+                          response['Server-Timing'])
+        self.assertContains(guest, 'Войти')
+        self.assertNotContains(guest, 'id="comment-form"')
+        self.assertContains(author, 'Пользователь: TestUser')
+        self.assertContains(author, 'редактировать пост')
+        self.assertContains(other, 'Пользователь: TestAuthor')
+        self.assertContains(other, 'id="comment-form"')
+        self.assertNotContains(other, 'редактировать пост')
+        self.assertEqual(len({guest['ETag'], author['ETag'],
+                              other['ETag']}), 3)
+
+    def test_follow_button_is_personal(self):
+        Follow.objects.create(user=self.author, author=self.user)
+        other_client = Client()
+        other_client.force_login(self.author)
+        self.assertContains(self.guest_client.get(self.profile_reverse),
+                            'Подписаться')
+        self.assertContains(other_client.get(self.profile_reverse),
+                            'Отписаться')
+
+    @override_settings(CACHE_LOCK_WAIT=0)
+    def test_stale_page_while_rebuilding(self):
+        """Пока страницу перестраивает другой запрос, остальные получают
+        прежнюю копию; тот, кто только что писал, — свежую."""
+        self.guest_client.get(self.index_reverse)
+        Post.objects.create(author=self.user, text='Новый пост')
+        slot = page_slot_key(RequestFactory().get(self.index_reverse))
+        self.assertTrue(acquire(slot))
+        self.addCleanup(release, slot)
+        with self.assertNumQueries(0):
+            stale = self.guest_client.get(self.index_reverse)
+        self.assertNotContains(stale, 'Новый пост')
+        writer = Client()
+        writer.cookies[PIN_COOKIE] = str(time.time() + 30)
+        self.assertContains(writer.get(self.index_reverse), 'Новый пост')
+        release(slot)
+        self.assertContains(self.guest_client.get(self.index_reverse),
+                            'Новый пост')
+
+    def test_stale_card_while_rebuilding(self):
+        key = card_key(self.post)
+        cache.set(key, (time.time() - 1, 'Старая карточка'))
+        self.assertTrue(acquire(key))
+        self.addCleanup(release, key)
+        self.assertContains(self.guest_client.get(self.group_reverse),
+                            'Старая карточка')
+        release(key)
+        Post.objects.filter(pk=self.post.pk).update(text=self.post.text)
+        cache.set(key, (time.time() - 1, 'Старая карточка'))
+        response = self.authorized_client.get(self.profile_reverse)
+        self.assertNotContains(response, 'Старая карточка')
+        self.assertContains(response, self.post.text)
+
+    def test_conditional_get(self):
+        """Неизменившаяся страница отдаётся как 304 без запросов к базе."""
+        etag = self.guest_client.get(self.index_reverse)['ETag']
+        with self.assertNumQueries(0):
+            response = self.guest_client.get(self.index_reverse,
+                                             HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # У авторизованного пользователя свой валидатор
+        self.assertEqual(self.authorized_client.get(
+            self.index_reverse, HTTP_IF_NONE_MATCH=etag).status_code, 200)
+        Post.objects.create(author=self.user, text='Новый пост')
+        response = self.guest_client.get(self.index_reverse,
+                                         HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_pages_cache_invalidated_by_writes(self):
+        """Комментарий и правка поста сразу видны на закэшированных
+        страницах поста, группы и профиля."""
+        urls = [self.post_reverse, self.group_reverse, self.profile_reverse]
+        for url in urls:
+            self.guest_client.get(url)
+        Comment.objects.create(text='Свежий коммент', post=self.post,
+                               author=self.user)
+        self.assertContains(self.guest_client.get(self.post_reverse),
+                            'Свежий коммент')
+        post = Post.objects.get(pk=self.post.pk)
+        post.text = 'Отредактированный текст'
+        post.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url),
+                                    'Отредактированный текст')
+
+    def test_pages_cache_follows_authors_and_groups(self):
+        """Имя автора, группа и число постов автора обновляются на
+        закэшированных страницах, где они выводятся."""
+        urls = [self.index_reverse, self.group_reverse, self.post_reverse]
+        for url in urls:
+            self.guest_client.get(url)
+        user = User.objects.get(pk=self.user.pk)
+        user.first_name, user.last_name = 'Новое', 'Имя'
+        user.save()
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertContains(self.guest_client.get(url), 'Новое Имя')
+        group = Group.objects.get(pk=self.group.pk)
+        group.title = 'Переименованная группа'
+        group.save()
+        self.assertContains(self.guest_client.get(self.post_reverse),
+                            'Переименованная группа')
+        Post.objects.create(author=self.user, text='Ещё пост')
+        response = self.guest_client.get(self.post_reverse)
+        self.assertEqual(response.context['author_post_count'], 2)
+
+    def test_comments_endpoint_returns_next_page(self):
+        """Комментарии после курсора отдаются фрагментом и JSON."""
+        for i in range(s.PER_PAGE):
+            Comment.objects.create(text=f'Коммент {i}', post=self.post,
+                                   author=self.user)
+        page_obj = self.guest_client.get(self.post_reverse).context[
+            'page_obj']
+        self.assertNotIn(self.comment, page_obj.object_list)
+        url = reverse('posts:comments', kwargs={'post_id': self.post.pk})
+        response = self.guest_client.get(
+            url, {'comments': page_obj.next_cursor})
+        self.assertContains(response, self.comment.text)
+        self.assertTemplateNotUsed(response, 'posts/post_detail.html')
+        self.assertEqual(response['X-Next-Cursor'], '')
+        data = self.guest_client.get(
+            url, {'comments': page_obj.next_cursor, 'format': 'json'}).json()
+        self.assertEqual([item['id'] for item in data['results']],
+                         [self.comment.pk])
+        self.assertIn(self.comment.text, data['results'][0]['html'])
+        self.assertIsNone(data['next'])
+        missing = reverse('posts:comments', kwargs={'post_id': 10 ** 6})
+        self.assertEqual(self.guest_client.get(missing).status_code, 404)
+
+    def test_add_comment_ajax(self):
+        """AJAX-комментарий возвращает только себя, без редиректа."""
+        url = reverse('posts:add_comment', kwargs={'post_id': self.post.pk})
+        response = self.authorized_client.post(
+            url, {'text': 'Комментарий без перезагрузки'},
+            HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertTrue(Comment.objects.filter(pk=data['id']).exists())
+        self.assertIn('Комментарий без перезагрузки', data['html'])
+        response = self.authorized_client.post(
+            url, {'text': ''}, HTTP_X_REQUESTED_WITH='XMLHttpRequest')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('text', response.json()['errors'])
+
+    def test_post_cards_are_cached_by_content(self):
+        """Карточка поста кэшируется и получает новый ключ при правке."""
+        # Карточки с ещё не готовой миниатюрой не кэшируются
+        thumbnails.generate(self.post.image.name)
+        self.guest_client.get(self.index_reverse)
+        post = Post.objects.select_related('author', 'group').get(
+            pk=self.post.pk)
+        old_key = card_key(post)
+        # В кэше — срок свежести и HTML карточки
+        self.assertIn(self.post.text, cache.get(old_key)[1])
+        post.text = 'Новый текст карточки'
+        self.assertNotEqual(card_key(post), old_key)
+        # Страница группы ещё не в кэше, а карточка — уже там
+        cache.set(old_key, (time.time() + 60, 'карточка из кэша'))
+        self.assertContains(self.guest_client.get(self.group_reverse),
+                            'карточка из кэша')
+
     def test_follow_unfollow_profile_create_and_delete_follows(self):
         follow_count = Follow.objects.count()
         response = self.authorized_client.post(
@@ -263,6 +453,159 @@ class PagesTests(TestCase):
         )
 
 
+class FollowFeedTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.author = User.objects.create_user(username='Author')
+        cls.old_post = Post.objects.create(text='Старый пост',
+                                           author=cls.author)
+
+    def setUp(self):
+        self.client.force_login(self.reader)
+        self.follow_url = reverse('posts:profile_follow',
+                                  kwargs={'username': self.author.username})
+        self.unfollow_url = reverse('posts:profile_unfollow',
+                                    kwargs={'username': self.author.username})
+
+    def _feed(self):
+        response = self.client.get(reverse('posts:follow_index'))
+        return list(response.context['page_obj'].object_list)
+
+    def test_follow_backfills_and_unfollow_trims_feed(self):
+        """Подписка добавляет старые посты в ленту, отписка убирает."""
+        self.client.get(self.follow_url)
+        new_post = Post.objects.create(text='Новый пост', author=self.author)
+        self.assertEqual(self._feed(), [new_post, self.old_post])
+        self.client.get(self.unfollow_url)
+        self.assertEqual(self._feed(), [])
+        self.assertFalse(FeedEntry.objects.filter(user=self.reader).exists())
+
+    def test_fan_out_respects_sqlite_variable_limit(self):
+        """Пачка раскладки не превышает 999 параметров SQLite."""
+        readers = User.objects.bulk_create(
+            User(username=f'Reader{i}') for i in range(300))
+        Follow.objects.bulk_create(
+            Follow(user_id=reader.pk, author=self.author)
+            for reader in User.objects.filter(username__in=[
+                reader.username for reader in readers]))
+        with CaptureQueriesContext(connection) as queries:
+            post = Post.objects.create(text='Пост', author=self.author)
+        inserts = [query['sql'] for query in queries.captured_queries
+                   if query['sql'].startswith('INSERT OR IGNORE INTO '
+                                              '"posts_feedentry"')]
+        self.assertEqual(len(inserts), 2)
+        self.assertEqual(post.feed_entries.count(), 300)
+
+    def test_rebuild_feeds_command_restores_feed(self):
+        """Команда rebuild_feeds собирает ленту из подписок заново."""
+        Follow.objects.create(user=self.reader, author=self.author)
+        FeedEntry.objects.all().delete()
+        call_command('rebuild_feeds', stdout=StringIO())
+        self.assertEqual(self._feed(), [self.old_post])
+
+
+class PageCacheCommitTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.author = User.objects.create_user(username='Author')
+
+    def test_page_cached_before_commit_is_invalidated(self):
+        """Страница, закэшированная между записью и коммитом, после
+        коммита не отдаётся: поколение меняется ещё раз."""
+        with transaction.atomic():
+            Post.objects.create(text='Пост в транзакции', author=self.author)
+            # Другой процесс видит новое поколение до коммита
+            self.client.get(reverse('posts:index'))
+            response = self.client.get(reverse('posts:index'))
+            self.assertIsNone(response.context)
+        response = self.client.get(reverse('posts:index'))
+        self.assertIsNotNone(response.context)
+
+
+class QueryCountTests(TestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.reader = User.objects.create_user(username='Reader')
+        cls.group = Group.objects.create(title='Группа', slug='group')
+        cls.post = cls._add_post(0)
+
+    @classmethod
+    def _add_post(cls, i):
+        author = User.objects.create_user(username=f'Author{i}')
+        group = Group.objects.create(title=f'Группа {i}', slug=f'group-{i}')
+        Follow.objects.create(user=cls.reader, author=author)
+        post = Post.objects.create(text=f'Пост {i}', author=author,
+                                   group=group)
+        # Все посты попадают и в общую группу, и под один профиль
+        Post.objects.create(text=f'Пост в группе {i}', author=author,
+                            group=cls.group)
+        Comment.objects.create(text=f'Коммент {i}', author=author,
+                               post=cls.post if i else post)
+        return post
+
+    def _count_queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            self.client.get(url)
+        return len(queries)
+
+    def test_query_count_does_not_depend_on_page_size(self):
+        """Число запросов страниц не растёт вместе с числом постов."""
+        self.client.force_login(self.reader)
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.post.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        ]
+        # Первый заход лениво создаёт счётчики автора — прогреваем
+        for url in urls:
+            self.client.get(url)
+        before = {url: self._count_queries(url) for url in urls}
+        for i in range(1, s.PER_PAGE):
+            self._add_post(i)
+        for url in urls:
+            with self.subTest(url=url):
+                self.assertEqual(self._count_queries(url), before[url])
+
+    @skipUnless(connection.vendor == 'sqlite', 'EXPLAIN QUERY PLAN SQLite')
+    def test_view_queries_do_not_sort_in_temp_btree(self):
+        """Запросы страниц берут порядок из индексов, а не сортируют
+        отобранные строки во временном B-дереве."""
+        for i in range(1, s.PER_PAGE + 2):
+            self._add_post(i)
+        self.client.force_login(self.reader)
+        second_page = self.client.get(reverse('posts:index')).context[
+            'page_obj'].next_cursor
+        urls = [
+            reverse('posts:index'),
+            reverse('posts:index') + f'?cursor={second_page}',
+            reverse('posts:index') + '?page=2',
+            reverse('posts:group_list', kwargs={'slug': self.group.slug}),
+            reverse('posts:profile',
+                    kwargs={'username': self.post.author.username}),
+            reverse('posts:post_detail', kwargs={'post_id': self.post.pk}),
+            reverse('posts:follow_index'),
+        ]
+        for url in urls:
+            cache.clear()
+            with CaptureQueriesContext(connection) as queries:
+                self.client.get(url)
+            for query in queries:
+                if not query['sql'].startswith('SELECT'):
+                    continue
+                with connection.cursor() as cursor:
+                    cursor.execute('EXPLAIN QUERY PLAN ' + query['sql'])
+                    plan = ' | '.join(row[-1] for row in cursor.fetchall())
+                with self.subTest(url=url, sql=query['sql']):
+                    self.assertNotIn('USE TEMP B-TREE', plan)
+
+
 class PaginatorViewsTest(TestCase):
     @classmethod
     def setUpClass(cls):
@@ -285,6 +628,7 @@ class PaginatorViewsTest(TestCase):
 
     def setUp(self):
         self.guest_client = Client()
+        cache.clear()
 
     def test_page_elements_number(self):
         if len(self.test_posts) <= 10:
@@ -306,3 +650,30 @@ class PaginatorViewsTest(TestCase):
                 self.assertEqual(
                     len(response.context.get('page_obj')),
                     len(self.test_posts) % s.PER_PAGE)
+
+    def test_cursor_pagination_walks_all_posts(self):
+        """Курсорные ссылки обходят все посты без повторов и пропусков."""
+        seen = []
+        url = reverse('posts:index')
+        page_obj = self.client.get(url).context.get('page_obj')
+        seen.extend(post.pk for post in page_obj)
+        while page_obj.has_next():
+            page_obj = self.client.get(
+                url, {'cursor': page_obj.next_cursor}).context['page_obj']
+            seen.extend(post.pk for post in page_obj)
+        expected = list(Post.objects.order_by('-created', '-id')
+                        .values_list('pk', flat=True))
+        self.assertEqual(seen, expected)
+        page_obj = self.client.get(
+            url, {'cursor': page_obj.previous_cursor}).context['page_obj']
+        self.assertEqual([post.pk for post in page_obj],
+                         expected[s.PER_PAGE:2 * s.PER_PAGE])
+
+    def test_cursor_pagination_keeps_page_links(self):
+        """Ссылки ?page=N и битые курсоры продолжают работать."""
+        response = self.client.get(reverse('posts:index'), {'page': 2})
+        self.assertEqual(response.context['page_obj'].number, 2)
+        response = self.client.get(reverse('posts:index'),
+                                   {'cursor': 'не-курсор'})
+        self.assertEqual(len(response.context['page_obj']), s.PER_PAGE)
+        self.assertFalse(response.context['page_obj'].has_previous())
@@ -0,0 +1,182 @@
+# posts/thumbnails.py
+"""Заблаговременная генерация миниатюр в фоновом пуле потоков.
+
+Шаблоны не создают миниатюры сами: пока миниатюры нет, выводится
+оригинал, а генерация ставится в очередь. После генерации поколение
+страниц поста сбрасывается, и страницы перерисовываются с миниатюрой.
+
+Для srcset каждая миниатюра режется ещё и на ширины SRCSET_WIDTHS в
+форматах THUMBNAIL_FORMATS (WebP, AVIF — если Pillow умеет их писать)
+и в формате оригинала для браузеров без их поддержки.
+"""
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings as s
+from django.core.files.storage import default_storage
+from django.db import connections, transaction
+from PIL import Image
+from sorl.thumbnail import default, get_thumbnail
+from sorl.thumbnail.base import EXTENSIONS
+from sorl.thumbnail.conf import defaults as sorl_defaults
+from sorl.thumbnail.conf import settings as sorl_settings
+from sorl.thumbnail.images import ImageFile
+
+from core import metrics
+
+logger = logging.getLogger(__name__)
+
+# Все размеры, которые выводят шаблоны: имя -> (геометрия, опции sorl)
+THUMBNAIL_SIZES = {
+    'card': ('960x339', {'crop': 'center', 'upscale': True}),
+}
+# Ширины вариантов миниатюры для srcset, по возрастанию
+SRCSET_WIDTHS = {
+    'card': (480, 720, 960),
+}
+MIME_TYPES = {'AVIF': 'image/avif', 'WEBP': 'image/webp'}
+
+# sorl знает расширения не всех форматов, которые пишет Pillow
+EXTENSIONS.setdefault('AVIF', 'avif')
+
+_executor = None
+_pending = set()
+_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    with _lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=s.THUMBNAIL_WORKERS,
+                thread_name_prefix='thumbnails',
+            )
+    return _executor
+
+
+def _full_options(source, options):
+    # Те же умолчания, что подставляет sorl в ThumbnailBackend.get_thumbnail,
+    # иначе имя файла миниатюры не совпадёт. Это внутренности sorl
+    # (_get_format, extra_options, _get_thumbnail_filename): версия
+    # закреплена в requirements.txt, совпадение имён проверяют тесты
+    backend = default.backend
+    options = dict(options)
+    if sorl_settings.THUMBNAIL_PRESERVE_FORMAT:
+        options.setdefault('format', backend._get_format(source))
+    for key, value in backend.default_options.items():
+        options.setdefault(key, value)
+    for key, attr in backend.extra_options:
+        value = getattr(sorl_settings, attr)
+        if value != getattr(sorl_defaults, attr):
+            options.setdefault(key, value)
+    return options
+
+
+def image_formats():
+    """Форматы вариантов из THUMBNAIL_FORMATS, которые пишет Pillow."""
+    Image.init()
+    return [format_ for format_ in s.THUMBNAIL_FORMATS
+            if format_ in Image.SAVE]
+
+
+def variants(size):
+    """Все варианты миниатюры size: (формат, ширина, геометрия, опции).
+
+    Формат None — формат оригинала; последним идёт вариант, который
+    создаётся последним.
+    """
+    geometry, options = THUMBNAIL_SIZES[size]
+    width, height = (int(side) for side in geometry.split('x'))
+    result = []
+    for format_ in image_formats() + [None]:
+        for variant_width in SRCSET_WIDTHS.get(size, (width,)):
+            variant_height = round(height * variant_width / width)
+            variant_options = dict(options)
+            if format_ is not None:
+                variant_options['format'] = format_
+            result.append((format_, variant_width,
+                           f'{variant_width}x{variant_height}',
+                           variant_options))
+    return result
+
+
+def _thumbnail_file(image, geometry, options):
+    source = ImageFile(image)
+    name = default.backend._get_thumbnail_filename(
+        source, geometry, _full_options(source, options))
+    return ImageFile(name, default.storage)
+
+
+def ready_thumbnail(image, size):
+    """Готовая миниатюра или None; сама миниатюру не создаёт."""
+    geometry, options = THUMBNAIL_SIZES[size]
+    return default.kvstore.get(_thumbnail_file(image, geometry, options))
+
+
+def ready_srcset(image, size):
+    """Готовые варианты миниатюры: {формат: [(ширина, высота, адрес)]}
+    по возрастанию ширины, или None, пока их создают.
+
+    generate() пишет варианты по порядку variants(), поэтому готовность
+    проверяется одним чтением kvstore — по последнему варианту. Размеры
+    задаёт геометрия: crop и upscale дают ровно её.
+    """
+    all_variants = variants(size)
+    *_, (_, _, geometry, options) = all_variants
+    if default.kvstore.get(_thumbnail_file(image, geometry, options)) is None:
+        return None
+    srcset = {}
+    for format_, width, geometry, options in all_variants:
+        height = int(geometry.split('x')[1])
+        url = _thumbnail_file(image, geometry, options).url
+        srcset.setdefault(format_, []).append((width, height, url))
+    return srcset
+
+
+def generate(name):
+    """Создаёт все миниатюры картинки и сбрасывает кэш страниц всех
+    постов с ней, а не только того, что поставил её в очередь."""
+    from .media import bump_posts
+    try:
+        started = time.perf_counter()
+        # Картинки постов лежат в default_storage, а не в хранилище
+        # миниатюр: от хранилища исходника зависят имена миниатюр
+        source = ImageFile(name, default_storage)
+        for size, (geometry, options) in THUMBNAIL_SIZES.items():
+            get_thumbnail(source, geometry, **options)
+            for _, _, geometry, options in variants(size):
+                get_thumbnail(source, geometry, **options)
+        metrics.observe_thumbnail(time.perf_counter() - started)
+        bump_posts(name)
+    except Exception:
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with _lock:
+            _pending.discard(name)
+        if threading.current_thread() is not threading.main_thread():
+            connections.close_all()
+
+
+def queue(image):
+    """Ставит генерацию миниатюр картинки поста в очередь после коммита.
+
+    THUMBNAIL_WORKERS = 0 — генерировать сразу, в текущем потоке.
+    """
+    if not image:
+        return
+    name = image.name
+
+    def submit():
+        with _lock:
+            if name in _pending:
+                return
+            _pending.add(name)
+        if s.THUMBNAIL_WORKERS:
+            _get_executor().submit(generate, name)
+        else:
+            generate(name)
+
+    transaction.on_commit(submit)
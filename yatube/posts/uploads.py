@@ -0,0 +1,89 @@
+# posts/uploads.py
+"""Нормализация картинок постов при загрузке.
+
+Оригинал с камеры — мегабайты пикселей и EXIF, которые иначе заново
+декодировались бы при каждой генерации миниатюр. При загрузке картинка
+поворачивается по EXIF-ориентации, уменьшается до IMAGE_UPLOAD_MAX_SIDE
+по большей стороне и перекодируется с качеством IMAGE_UPLOAD_QUALITY
+без метаданных (цветовой профиль сохраняется, если не меняется
+цветовая модель).
+
+Загрузку больше FILE_UPLOAD_MAX_MEMORY_SIZE Django уже держит во
+временном файле; JPEG декодируется сразу в уменьшенном масштабе
+(Image.draft), а результат пишется в SpooledTemporaryFile — в памяти
+целиком не оказываются ни оригинал, ни результат.
+"""
+import os
+import tempfile
+
+from django.conf import settings as s
+from django.core.files import File
+from PIL import Image, ImageOps
+
+# Форматы, в которых картинка остаётся; остальные перекодируются в JPEG,
+# а с прозрачностью — в PNG
+KEPT_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif', 'WEBP': 'webp'}
+
+
+def _has_alpha(image):
+    return (image.mode in ('RGBA', 'LA', 'PA')
+            or 'transparency' in image.info)
+
+
+def _target_format(image):
+    if image.format in KEPT_FORMATS:
+        return image.format
+    return 'PNG' if _has_alpha(image) else 'JPEG'
+
+
+def _save_options(format_, icc_profile):
+    options = {'format': format_, 'optimize': True}
+    if format_ in ('JPEG', 'WEBP'):
+        options['quality'] = s.IMAGE_UPLOAD_QUALITY
+    if format_ == 'JPEG':
+        options['progressive'] = True
+    if icc_profile:
+        options['icc_profile'] = icc_profile
+    return options
+
+
+def _convert(image, format_):
+    if format_ == 'JPEG' and image.mode not in ('RGB', 'L'):
+        return image.convert('RGB')
+    if format_ == 'GIF' and image.mode not in ('P', 'L'):
+        return image.convert('P', palette=Image.ADAPTIVE)
+    return image
+
+
+def normalize(upload):
+    """Уменьшенная и перекодированная копия загруженной картинки (File).
+
+    Анимированные картинки возвращаются как есть: перекодирование
+    оставило бы от них первый кадр.
+    """
+    upload.seek(0)
+    image = Image.open(upload)
+    if getattr(image, 'is_animated', False):
+        upload.seek(0)
+        return upload
+    source_format = image.format
+    format_ = _target_format(image)
+    icc_profile = image.info.get('icc_profile')
+    max_side = s.IMAGE_UPLOAD_MAX_SIDE
+    # Для JPEG декодер сразу даёт уменьшенную в 2-8 раз картинку
+    image.draft('RGB', (max_side, max_side))
+    image = ImageOps.exif_transpose(image)
+    image.thumbnail((max_side, max_side), Image.LANCZOS)
+    converted = _convert(image, format_)
+    if converted.mode != image.mode:
+        # Профиль описывает прежние каналы (CMYK-профиль у RGB-картинки
+        # исказил бы цвета): без него браузер считает картинку sRGB
+        icc_profile = None
+    output = tempfile.SpooledTemporaryFile(
+        max_size=s.FILE_UPLOAD_MAX_MEMORY_SIZE)
+    converted.save(output, **_save_options(format_, icc_profile))
+    output.seek(0)
+    name = os.path.basename(upload.name)
+    if format_ != source_format:
+        name = f'{os.path.splitext(name)[0]}.{KEPT_FORMATS[format_]}'
+    return File(output, name=name)
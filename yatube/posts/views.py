@@ -3,32 +3,95 @@ from django.core.paginator import Paginator
 from django.shortcuts import render, get_object_or_404
 from django.contrib.auth.decorators import login_required
 from django.shortcuts import redirect
+from django.http import JsonResponse
+from django.template.loader import render_to_string
 from django.conf import settings as s
-from django.views.decorators.cache import cache_page
+from django.core.cache import cache
+from django.db import transaction
 
-from .models import Post, Group, User, Comment, Follow
+from core.cache import cache_page_by_generations
+from core.paginator import CursorPaginator
+from . import generations, search, thumbnails
+from .counters import get_author_stats
+from .models import (
+    ArchivedPost, Post, Group, User, Follow, FeedEntry)
 from .forms import PostForm, CommentForm
 
 
 def pagination(request, queryset):
-    request = request.GET.get('page')
-    paginator = Paginator(queryset, s.PER_PAGE)
-    page_obj = paginator.get_page(request)
-    return page_obj
+    # Старые ссылки ?page=N обслуживаем прежним OFFSET-паджинатором,
+    # всё остальное листаем курсором по (created, id)
+    page_number = request.GET.get('page')
+    if page_number is not None:
+        paginator = Paginator(queryset, s.PER_PAGE)
+        return paginator.get_page(page_number)
+    paginator = CursorPaginator(queryset, s.PER_PAGE)
+    return paginator.page_by_cursor(request.GET.get('cursor'))
 
 
-@cache_page(20)
+def get_post_or_404(post_id, *related):
+    """Пост из горячей таблицы, а если его там нет — из архива."""
+    post = Post.objects.select_related(*related).filter(id=post_id).first()
+    if post is not None:
+        return post
+    return get_object_or_404(
+        ArchivedPost.objects.select_related(*related), id=post_id)
+
+
+def post_author_id(post_id):
+    """Автор поста — для поколения его страницы.
+
+    Автор поста не меняется, а id не используются повторно: ответ
+    кэшируется бессрочно.
+    """
+    key = f'post-author:{post_id}'
+    author_id = cache.get(key)
+    if author_id is None:
+        author_id = next(
+            (author_id for model in (Post, ArchivedPost)
+             for author_id in model.objects.filter(pk=post_id)
+             .values_list('author_id', flat=True)), None)
+        if author_id is not None:
+            cache.set(key, author_id, None)
+    return author_id
+
+
+def comments_page(request, post):
+    # У комментариев свой курсор ?comments=, независимый от постов;
+    # у архивного поста комментарии тоже в архиве
+    comments = post.comments.select_related('author')
+    paginator = CursorPaginator(comments, s.PER_PAGE)
+    return paginator.page_by_cursor(request.GET.get('comments'))
+
+
+def serialize_comment(request, comment):
+    return {
+        'id': comment.pk,
+        'author': comment.author.username,
+        'text': comment.text,
+        'created': comment.created.isoformat(),
+        'html': render_to_string('posts/includes/comment.html',
+                                 {'comment': comment}, request),
+    }
+
+
+@cache_page_by_generations(
+    lambda request: [generations.feed_key(), generations.groups_key(),
+                     generations.authors_key()])
 def index(request):
-    post_list = Post.objects.all()
+    post_list = Post.objects.select_related('author', 'group')
     context = {
         'page_obj': pagination(request, post_list)
     }
     return render(request, 'posts/index.html', context)
 
 
+@cache_page_by_generations(
+    lambda request, slug: [generations.group_key(slug),
+                           generations.authors_key()])
 def group_posts(request, slug):
     group = get_object_or_404(Group, slug=slug)
-    post_list = group.posts.all()
+    post_list = group.posts.select_related('author', 'group')
     context = {
         'group': group,
         'page_obj': pagination(request, post_list),
@@ -36,40 +99,107 @@ def group_posts(request, slug):
     return render(request, 'posts/group_list.html', context)
 
 
+@cache_page_by_generations(
+    lambda request, username: [generations.profile_key(username),
+                               generations.groups_key()])
 def profile(request, username):
-    post_author = get_object_or_404(User, username=username)
-    post_list = post_author.posts.all()
-    post_count = post_list.count()
-    following = request.user.is_authenticated \
-        and Follow.objects.filter(
-            user=request.user,
-            author__username=username
-        ).exists()
+    post_author = get_object_or_404(
+        User.objects.select_related('stats'), username=username)
+    # ?archive=1 листает архив автора, начиная с самых новых архивных
+    archive = 'archive' in request.GET
+    posts = post_author.archived_posts if archive else post_author.posts
+    page_obj = pagination(request, posts.select_related('author', 'group'))
+    post_count = get_author_stats(post_author).post_count
+    # Кнопка подписки своя у каждого зрителя — это дырка в кэшируемой
+    # странице (posts/holes.py)
     context = {
-        'page_obj': pagination(request, post_list),
+        'page_obj': page_obj,
         'username': username,
         'post_count': post_count,
         'post_author': post_author,
-        'following': following
+        'archive': archive,
+        # Ссылка на архив — в конце горячих постов
+        'has_archive': not archive and not page_obj.has_next()
+        and post_author.archived_posts.exists(),
     }
     return render(request, 'posts/profile.html', context)
 
 
+@cache_page_by_generations(
+    lambda request, post_id: [
+        generations.post_key(post_id), generations.groups_key(),
+        generations.authors_key(),
+        generations.author_key(post_author_id(post_id))])
 def post_detail(request, post_id):
-    this_post = get_object_or_404(Post, id=post_id)
-    author_post_count = this_post.author.posts.count()
-    form = CommentForm(request.POST or None)
-    comments = Comment.objects.filter(post=this_post.id)
+    this_post = get_post_or_404(post_id, 'author__stats', 'group')
+    author_post_count = get_author_stats(this_post.author).post_count
     context = {
         'post': this_post,
         'author_post_count': author_post_count,
-        'form': form,
-        'page_obj': pagination(request, comments)
+        'page_obj': comments_page(request, this_post)
     }
     return render(request, 'posts/post_detail.html', context)
 
 
+@cache_page_by_generations(
+    lambda request, post_id: [generations.post_key(post_id),
+                              generations.authors_key()])
+def post_comments(request, post_id):
+    """Следующая страница комментариев после курсора ?comments=:
+    HTML-фрагмент (курсор дальше — в X-Next-Cursor) или JSON
+    при ?format=json."""
+    page_obj = comments_page(request, get_post_or_404(post_id))
+    if request.GET.get('format') == 'json':
+        return JsonResponse({
+            'results': [serialize_comment(request, comment)
+                        for comment in page_obj],
+            'next': page_obj.next_cursor,
+        })
+    response = render(request, 'posts/includes/comments.html',
+                      {'comments': page_obj})
+    response['X-Next-Cursor'] = page_obj.next_cursor or ''
+    return response
+
+
+def search_page(request):
+    query = request.GET.get('q', '')
+    found = search.search_posts(
+        Post.objects.select_related('author', 'group'), query)
+    paginator = CursorPaginator(found, s.PER_PAGE, ordering=('rank', '-id'))
+    return query, paginator.page_by_cursor(request.GET.get('cursor'))
+
+
+def post_search(request):
+    query, page_obj = search_page(request)
+    context = {
+        'query': query,
+        'page_obj': page_obj,
+    }
+    return render(request, 'posts/search.html', context)
+
+
+def post_search_api(request):
+    query, page_obj = search_page(request)
+    return JsonResponse({
+        'query': query,
+        'results': [
+            {
+                'id': post.pk,
+                'text': post.text,
+                'author': post.author.username,
+                'group': post.group.slug if post.group else None,
+                'created': post.created.isoformat(),
+                'url': request.build_absolute_uri(post.get_absolute_url()),
+            }
+            for post in page_obj
+        ],
+        'next': page_obj.next_cursor,
+        'previous': page_obj.previous_cursor,
+    })
+
+
 @login_required
+@transaction.atomic
 def post_create(request):
     form = PostForm(
         request.POST or None,
@@ -79,6 +209,7 @@ def post_create(request):
         post = form.save(commit=False)
         post.author = request.user
         post.save()
+        thumbnails.queue(post.image)
         return redirect('posts:profile', post.author)
     context = {
         'form': form,
@@ -88,6 +219,7 @@ def post_create(request):
 
 
 @login_required
+@transaction.atomic
 def post_edit(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     user = request.user
@@ -100,7 +232,9 @@ def post_edit(request, post_id):
         instance=post
     )
     if form.is_valid():
-        form.save()
+        post = form.save()
+        if 'image' in form.changed_data:
+            thumbnails.queue(post.image)
         return redirect('posts:post_detail', post_id)
     context = {
         'form': form,
@@ -111,6 +245,7 @@ def post_edit(request, post_id):
 
 
 @login_required
+@transaction.atomic
 def add_comment(request, post_id):
     post = get_object_or_404(Post, id=post_id)
     form = CommentForm(request.POST or None)
@@ -119,19 +254,31 @@ def add_comment(request, post_id):
         comment.author = request.user
         comment.post = post
         comment.save()
+        if request.is_ajax():
+            # Вместо редиректа и полной перерисовки поста — только
+            # новый комментарий
+            return JsonResponse(serialize_comment(request, comment),
+                                status=201)
+    elif request.is_ajax():
+        return JsonResponse({'errors': form.errors}, status=400)
     return redirect('posts:post_detail', post_id=post_id)
 
 
 @login_required
 def follow_index(request):
-    post_list = Post.objects.filter(author__following__user=request.user)
+    # Читаем материализованную ленту вместо join'а постов с подписками
+    feed = FeedEntry.objects.filter(user=request.user).select_related(
+        'post__author', 'post__group')
+    page_obj = pagination(request, feed)
+    page_obj.object_list = [entry.post for entry in page_obj]
     context = {
-        'page_obj': pagination(request, post_list)
+        'page_obj': page_obj
     }
     return render(request, 'posts/follow.html', context)
 
 
 @login_required
+@transaction.atomic
 def profile_follow(request, username):
     author = get_object_or_404(User, username=username)
     if request.user.is_authenticated and author != request.user \
@@ -143,6 +290,7 @@ def profile_follow(request, username):
 
 
 @login_required
+@transaction.atomic
 def profile_unfollow(request, username):
     author = get_object_or_404(User, username=username)
     follow = get_object_or_404(Follow, user=request.user, author=author)
@@ -0,0 +1,44 @@
+// Догрузка комментариев и отправка нового без перезагрузки страницы.
+// Без JavaScript работают обычные ссылка «Ещё» и форма.
+document.addEventListener('DOMContentLoaded', function () {
+  var list = document.getElementById('comments');
+  if (!list) {
+    return;
+  }
+  var ajax = {'X-Requested-With': 'XMLHttpRequest'};
+
+  var more = document.getElementById('comments-more');
+  if (more) {
+    more.addEventListener('click', function (event) {
+      event.preventDefault();
+      fetch(more.dataset.url, {headers: ajax}).then(function (response) {
+        var next = response.headers.get('X-Next-Cursor');
+        return response.text().then(function (html) {
+          list.insertAdjacentHTML('beforeend', html);
+          if (next) {
+            more.dataset.url = more.dataset.base + encodeURIComponent(next);
+          } else {
+            more.remove();
+          }
+        });
+      });
+    });
+  }
+
+  var form = document.getElementById('comment-form');
+  if (form) {
+    form.addEventListener('submit', function (event) {
+      event.preventDefault();
+      fetch(form.action, {
+        method: 'POST', body: new FormData(form), headers: ajax,
+      }).then(function (response) {
+        return response.json();
+      }).then(function (data) {
+        if (data.html) {
+          list.insertAdjacentHTML('afterbegin', data.html);
+          form.reset();
+        }
+      });
+    });
+  }
+});
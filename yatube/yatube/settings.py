@@ -49,6 +49,8 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'core.middleware.MetricsMiddleware',
+    'core.middleware.ReplicaRoutingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -56,14 +58,30 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    # Работает только при REPEATED_QUERY_CHECK
+    'core.middleware.RepeatedQueryMiddleware',
+    # Последним: снимок получает заголовки безопасности всех выше
+    'core.middleware.StaticSnapshotMiddleware',
 ]
 
+# Ловим N+1: один SQL-шаблон больше REPEATED_QUERY_THRESHOLD раз.
+# В тестах включается всегда (core/test_runner.py)
+REPEATED_QUERY_CHECK = DEBUG
+REPEATED_QUERY_THRESHOLD = 3
+REPEATED_QUERY_RAISE = False
+# sorl-thumbnail читает свой kvstore по ключу на каждую картинку
+REPEATED_QUERY_IGNORE = ['thumbnail_kvstore']
+# Токен для /metrics (заголовок Authorization: Bearer <токен>);
+# None — эндпоинт выключен и отвечает 404
+METRICS_TOKEN = None
+
 ROOT_URLCONF = 'yatube.urls'
 
 TEMPLATES_DIR = os.path.join(BASE_DIR, 'templates')
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        # DjangoTemplates, замеряющий время рендеринга для метрик
+        'BACKEND': 'core.template_backends.DjangoTemplates',
         'DIRS': [TEMPLATES_DIR],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -81,16 +99,49 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'yatube.wsgi.application'
 
+# Тесты получают свой файл кэша на каждый прогон
+TEST_RUNNER = 'core.test_runner.TestRunner'
+
 
 # Database
 # https://docs.djangoproject.com/en/2.2/ref/settings/#databases
 
 DATABASES = {
     'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
+        # sqlite3 с PRAGMA и BEGIN IMMEDIATE (core/db_backends/sqlite3)
+        'ENGINE': 'core.db_backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
+        # Соединение живёт между запросами, а не открывается на каждый
+        'CONN_MAX_AGE': 60,
+        'OPTIONS': {
+            'transaction_mode': 'IMMEDIATE',
+            'pragmas': {
+                # Читатели не блокируют писателя и наоборот
+                'journal_mode': 'WAL',
+                # В WAL fsync только на checkpoint: без потери целостности
+                'synchronous': 'NORMAL',
+                'mmap_size': 256 * 2 ** 20,
+                # Ждать освобождения блокировки, а не падать сразу, мс
+                'busy_timeout': 5000,
+                # Отрицательное значение — в КиБ: 64 МиБ на соединение
+                'cache_size': -64 * 1024,
+            },
+        },
     }
 }
+# Копия основной базы для чтения, её обновляет manage.py sync_replica.
+# В тестах — зеркало основной базы
+DATABASES['replica'] = dict(
+    DATABASES['default'],
+    NAME=os.path.join(BASE_DIR, 'db.replica.sqlite3'),
+    TEST={'MIRROR': 'default'},
+)
+# Алиасы, с которых читают безопасные запросы; пусто — всё читается из
+# основной базы. Включать после первого sync_replica
+DATABASE_REPLICAS = []
+DATABASE_ROUTERS = ['core.db_routers.PrimaryReplicaRouter']
+# Сколько секунд после записи пользователь читает из основной базы
+REPLICA_PIN_SECONDS = 30
 
 
 # Password validation
@@ -141,8 +192,60 @@ PER_PAGE = 10
 CSRF_FAILURE_VIEW = 'core.views.csrf_failure'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+# Файлы именуются по содержимому и хранятся один раз (core/storage.py);
+# ссылки на них считает posts/media.py
+DEFAULT_FILE_STORAGE = 'core.storage.ContentAddressedStorage'
+# Кэш в файле SQLite общий для всех воркеров на машине (core/cache_backends.py)
+# Служебные файлы сайта (кэш): каталог доступен только владельцу
+VAR_DIR = os.path.join(BASE_DIR, 'var')
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'BACKEND': 'core.cache_backends.SQLiteCache',
+        'LOCATION': os.path.join(VAR_DIR, 'cache.sqlite3'),
+        'OPTIONS': {
+            'MAX_ENTRIES': 100000,
+            'MAX_SIZE': 256 * 2 ** 20,
+        },
     }
 }
+# Размер пачки при раскладке постов по лентам подписчиков
+FEED_BATCH_SIZE = 500
+# Посты старше стольких дней archive_posts переносит в архив
+ARCHIVE_AFTER_DAYS = 365 * 2
+# Постов в одной транзакции переноса; не больше лимита SQLite на
+# число параметров запроса (999)
+ARCHIVE_BATCH_SIZE = 500
+# Страницы инвалидируются поколениями (core/cache.py), поэтому
+# их можно хранить долго
+PAGE_CACHE_TIMEOUT = 60 * 60 * 6
+# Сколько секунд после срока свежести запись кэша ещё можно отдать
+# устаревшей, пока её перестраивает другой запрос
+CACHE_STALE_GRACE = 60
+# Блокировка перестройки истекает сама, если запрос упал, секунд
+CACHE_LOCK_TIMEOUT = 10
+# Сколько ждать чужой перестройки, когда устаревшей копии нет
+CACHE_LOCK_WAIT = 2.0
+# Карточки постов версионируются по содержимому (posts/templatetags)
+POST_CARD_CACHE_TIMEOUT = 60 * 60 * 24
+# Статические снимки страниц для анонимов (core/snapshots.py);
+# None — выключены. Их поколения хранятся в кэше, поэтому и файлы
+# живут рядом с файлом кэша, в закрытом каталоге
+SNAPSHOT_ROOT = os.path.join(VAR_DIR, 'snapshots')
+# Адреса (регулярные выражения), у которых бывают снимки: первые
+# страницы главной и групп и раздел «О проекте»
+SNAPSHOT_PATHS = [r'/', r'/group/[^/]+/', r'/about/(author|tech)/']
+# Рядом с index.html класть index.html.gz для Accept-Encoding: gzip
+SNAPSHOT_GZIP = True
+# Хост запроса, с которым publish_snapshots отрисовывает страницы
+SNAPSHOT_HOST = 'localhost'
+# Миниатюрам sorl нужны свои имена: обычное хранилище
+THUMBNAIL_STORAGE = 'django.core.files.storage.FileSystemStorage'
+# Фоновые потоки генерации миниатюр; 0 — генерировать сразу
+THUMBNAIL_WORKERS = 2
+# Форматы вариантов для srcset в порядке предпочтения; форматы, которые
+# Pillow не умеет писать (AVIF без плагина), пропускаются
+THUMBNAIL_FORMATS = ['AVIF', 'WEBP']
+# Загруженные картинки уменьшаются до этой стороны и перекодируются
+# с этим качеством, без метаданных (posts/uploads.py)
+IMAGE_UPLOAD_MAX_SIDE = 2048
+IMAGE_UPLOAD_QUALITY = 85